@@ -1,18 +1,82 @@
-import json
+import atexit
+import logging
+import orjson
 import os
 import hashlib
-from datetime import datetime
-from typing import Dict, Any
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
-from cryptography.hazmat.primitives import hashes, serialization
+import struct
+import time
+import queue
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+from cryptography.hazmat.primitives.asymmetric import ed25519
+from cryptography.hazmat.primitives import serialization
 from app.domain.models import AuditLogEntry
 
+logger = logging.getLogger(__name__)
+
+TAIL_BLOCK_SIZE = 4096
+# fsync once this much data or time has accumulated since the last sync
+FSYNC_MAX_BYTES = 1 << 20
+FSYNC_MAX_INTERVAL = 1.0
+# Sidecar index record: log size in bytes || raw sha256 of the last line
+INDEX_FORMAT = "<Q32s"
+INDEX_SIZE = struct.calcsize(INDEX_FORMAT)
+# Background writer: bounded backlog, and how many entries it signs per write
+QUEUE_MAX_SIZE = 10000
+DRAIN_BATCH_SIZE = 256
+# A failed batch write is retried this many times (doubling delay) before the
+# adapter gives up and refuses further entries
+WRITE_MAX_ATTEMPTS = 5
+WRITE_RETRY_BASE = 0.1
+
+def _write_all(fd: int, data: bytes):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def _canonical_payload(entry: Dict[str, Any]) -> bytes:
+    # The signed bytes of an entry: every field except the signature, sorted keys.
+    # Verifiers walk the chain by recomputing sha256 of this for the previous entry.
+    return orjson.dumps({
+        "timestamp": entry["timestamp"],
+        "user_id": entry["user_id"],
+        "action": entry["action"],
+        "details": entry["details"],
+        "previous_hash": entry["previous_hash"]
+    }, option=orjson.OPT_SORT_KEYS)
+
+def _chain_hash(payload: bytes) -> str:
+    # hashlib.sha256 is backed by OpenSSL, which already selects the SHA-NI /
+    # ARMv8 SHA2 code path at runtime.
+    return hashlib.sha256(payload).hexdigest()
+
 class CryptoAuditAdapter:
     def __init__(self, log_path: str = "audit_log.jsonl", private_key_path: str = "private_key.pem"):
         self.log_path = log_path
         self.private_key_path = private_key_path
+        self.index_path = log_path + ".idx"
+        self._last_hash: Optional[str] = None
         self._load_or_generate_keys()
-        
+        # Unbuffered: each batch goes out in one write, and a failed write can be
+        # cut back off the file instead of lingering in a userspace buffer
+        self._fp = open(self.log_path, "ab", buffering=0)
+        self._offset = self._fp.tell()
+        self._closed = False
+        self._error: Optional[BaseException] = None # Set once writes have failed for good
+        self._idx_fd = os.open(self.index_path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._init_last_hash()
+        self._pending_bytes = 0
+        self._last_sync = time.monotonic()
+        # Callers only enqueue; signing and writing happen on the worker thread
+        self._lock = threading.Lock()
+        self._q: queue.Queue = queue.Queue(maxsize=QUEUE_MAX_SIZE)
+        self._worker = threading.Thread(target=self._drain, name="audit-writer", daemon=True)
+        self._worker.start()
+        # The worker thread references self, so __del__ never runs before exit;
+        # flush explicitly or the daemon thread dies with entries still queued
+        atexit.register(self.close)
+
     def _load_or_generate_keys(self):
         if os.path.exists(self.private_key_path):
             with open(self.private_key_path, "rb") as key_file:
@@ -20,73 +84,211 @@ class CryptoAuditAdapter:
                     key_file.read(),
                     password=None
                 )
-        else:
-            self.private_key = rsa.generate_private_key(
-                public_exponent=65537,
-                key_size=2048,
-            )
-            # Save it (in secure real app, this needs HSM/Vault)
-            with open(self.private_key_path, "wb") as f:
-                f.write(self.private_key.private_bytes(
-                    encoding=serialization.Encoding.PEM,
-                    format=serialization.PrivateFormat.PKCS8,
-                    encryption_algorithm=serialization.NoEncryption()
-                ))
-
-    def _get_last_hash(self) -> str:
-        if not os.path.exists(self.log_path):
-            return "0" * 64
-        
-        last_line = ""
-        with open(self.log_path, "r") as f:
-            for line in f:
-                if line.strip():
-                    last_line = line
-        
-        if not last_line:
-            return "0" * 64
-            
+            if isinstance(self.private_key, ed25519.Ed25519PrivateKey):
+                return
+            # Older installs signed with RSA. Keep that key around so existing
+            # entries stay verifiable, and start signing with a fresh Ed25519 key.
+            os.replace(self.private_key_path, self.private_key_path + ".legacy")
+
+        self.private_key = ed25519.Ed25519PrivateKey.generate()
+        # Save it (in secure real app, this needs HSM/Vault)
+        with open(self.private_key_path, "wb") as f:
+            f.write(self.private_key.private_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PrivateFormat.PKCS8,
+                encryption_algorithm=serialization.NoEncryption()
+            ))
+
+    def _init_last_hash(self):
+        # O(1) startup from the sidecar index; it only matches the log if the
+        # last run flushed cleanly, otherwise fall back to reading the tail.
+        os.lseek(self._idx_fd, 0, os.SEEK_SET)
+        record = os.read(self._idx_fd, INDEX_SIZE)
+        if len(record) == INDEX_SIZE:
+            offset, last_hash = struct.unpack(INDEX_FORMAT, record)
+            if offset == self._offset:
+                self._last_hash = last_hash.hex()
+                return
+        self._init_last_hash_from_tail()
+
+    def _init_last_hash_from_tail(self):
+        # Read only the tail of the log instead of scanning every line
+        self._last_hash = "0" * 64
+
+        with open(self.log_path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            tail = b""
+            lines = []
+            while pos > 0:
+                step = min(TAIL_BLOCK_SIZE, pos)
+                pos -= step
+                f.seek(pos)
+                tail = f.read(step) + tail
+                lines = [l for l in tail.splitlines(keepends=True) if l.strip()]
+                # The first line in the buffer may be cut off; keep reading until
+                # the last non-empty line is preceded by a complete one.
+                if len(lines) > 1:
+                    break
+
+        if not lines:
+            return
+
         try:
-            entry = json.loads(last_line)
-            # Reconstruct signature input to verify or just use the sig as link?
-            # Stronger chain uses hash of full previous object
-            return hashlib.sha256(last_line.encode()).hexdigest()
-        except:
-            return "0" * 64
+            last_entry = orjson.loads(lines[-1])
+            self._last_hash = _chain_hash(_canonical_payload(last_entry))
+        except (ValueError, KeyError, TypeError):
+            pass
 
     def log_action(self, user_id: str, action: str, details: Dict[str, Any]):
-        prev_hash = self._get_last_hash()
-        timestamp = datetime.utcnow().isoformat()
-        
-        # Prepare data to sign
-        # Canonicalize JSON for consistent hashing
-        data_to_sign_dict = {
-            "timestamp": timestamp,
-            "user_id": user_id,
-            "action": action,
-            "details": details,
-            "previous_hash": prev_hash
-        }
-        data_bytes = json.dumps(data_to_sign_dict, sort_keys=True).encode()
-        
-        # Sign content
-        signature = self.private_key.sign(
-            data_bytes,
-            padding.PSS(
-                mgf=padding.MGF1(hashes.SHA256()),
-                salt_length=padding.PSS.MAX_LENGTH
-            ),
-            hashes.SHA256()
-        )
-        
-        entry = AuditLogEntry(
-            timestamp=datetime.fromisoformat(timestamp),
-            user_id=user_id,
-            action=action,
-            details=details,
-            previous_hash=prev_hash,
-            signature=signature.hex()
-        )
-        
-        with open(self.log_path, "a") as f:
-            f.write(entry.json() + "\n")
+        # Blocks only if the writer falls QUEUE_MAX_SIZE entries behind;
+        # audit records are never dropped, so refuse them once nothing can write.
+        if self._closed:
+            raise RuntimeError("Audit log is closed")
+        self._raise_if_failed()
+        self._q.put((datetime.now(timezone.utc).isoformat(), user_id, action, details))
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise RuntimeError("Audit log writes are failing; entries cannot be recorded") from self._error
+
+    def _drain(self):
+        while True:
+            batch = [self._q.get()]
+            while len(batch) < DRAIN_BATCH_SIZE:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = [r for r in batch if r is not None]
+            if records:
+                try:
+                    self._write_with_retry(records)
+                except Exception as e:
+                    # Leave the batch unacknowledged and stop; log_action and
+                    # flush raise from here on instead of losing entries quietly
+                    logger.critical("Audit log write failed permanently; %d entries not recorded", len(records))
+                    self._error = e
+                    return
+
+            for _ in batch:
+                self._q.task_done()
+
+            if len(records) < len(batch):
+                return # close() sentinel
+
+    def _write_with_retry(self, records):
+        for attempt in range(WRITE_MAX_ATTEMPTS):
+            try:
+                with self._lock:
+                    self._write_batch(records)
+                break
+            except Exception:
+                if attempt + 1 >= WRITE_MAX_ATTEMPTS:
+                    raise
+                logger.exception("Audit log write failed; retrying")
+                time.sleep(WRITE_RETRY_BASE * 2 ** attempt)
+
+        # The entries are in the file now; a failed fsync is retried on the next one
+        try:
+            with self._lock:
+                if (self._pending_bytes >= FSYNC_MAX_BYTES
+                        or time.monotonic() - self._last_sync >= FSYNC_MAX_INTERVAL):
+                    self._sync()
+        except Exception:
+            logger.exception("Audit log fsync failed")
+
+    def _write_batch(self, records):
+        lines = []
+        # Chain on a local copy; self._last_hash only moves once the batch is written
+        last_hash = self._last_hash
+        for timestamp, user_id, action, details in records:
+            prev_hash = last_hash
+
+            # Prepare data to sign
+            # Canonicalize JSON for consistent hashing
+            data_to_sign_dict = {
+                "timestamp": timestamp,
+                "user_id": user_id,
+                "action": action,
+                "details": details,
+                "previous_hash": prev_hash
+            }
+            data_bytes = _canonical_payload(data_to_sign_dict)
+
+            # Sign content
+            signature = self.private_key.sign(data_bytes)
+            # The next entry links to this payload; no need to hash the full line later
+            last_hash = _chain_hash(data_bytes)
+
+            entry = AuditLogEntry(
+                timestamp=datetime.fromisoformat(timestamp),
+                user_id=user_id,
+                action=action,
+                details=details,
+                previous_hash=prev_hash,
+                signature=signature.hex()
+            )
+
+            # All fields are primitives (plus a datetime orjson handles natively),
+            # so skip pydantic's JSON encoder and the str -> bytes round-trip
+            lines.append(orjson.dumps(entry.model_dump(), option=orjson.OPT_APPEND_NEWLINE))
+
+        # One write for the whole batch. If it fails partway, truncate back to the
+        # last complete entry so the retry (or the next start) chains on a clean tail.
+        data = b"".join(lines)
+        try:
+            _write_all(self._fp.fileno(), data)
+        except BaseException:
+            os.ftruncate(self._fp.fileno(), self._offset)
+            raise
+        self._last_hash = last_hash
+        self._offset += len(data)
+        self._pending_bytes += len(data)
+
+    def flush(self):
+        """Waits for queued entries to be written, then fsyncs them to disk."""
+        if self._fp.closed:
+            raise RuntimeError("Audit log is closed")
+        # Like Queue.join(), but stops waiting if the writer has given up
+        with self._q.all_tasks_done:
+            while self._q.unfinished_tasks and self._worker.is_alive():
+                self._q.all_tasks_done.wait(0.1)
+        self._raise_if_failed()
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        os.fsync(self._fp.fileno())
+        self._write_index()
+        self._pending_bytes = 0
+        self._last_sync = time.monotonic()
+
+    def _write_index(self):
+        record = struct.pack(INDEX_FORMAT, self._offset, bytes.fromhex(self._last_hash))
+        os.lseek(self._idx_fd, 0, os.SEEK_SET)
+        os.write(self._idx_fd, record)
+        os.fsync(self._idx_fd)
+
+    def close(self):
+        if self._fp.closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        if self._worker.is_alive():
+            self._q.put(None)
+            self._worker.join()
+        try:
+            if self._error is None:
+                with self._lock:
+                    self._sync()
+        finally:
+            self._fp.close()
+            os.close(self._idx_fd)
+        self._raise_if_failed()
+
+    def __del__(self):
+        fp = getattr(self, "_fp", None)
+        if fp is not None:
+            self.close()
@@ -1,25 +1,37 @@
 from typing import List, Optional, Dict, Any
-from kubernetes import client, config
+from concurrent.futures import ThreadPoolExecutor
+from kubernetes import client, config, dynamic
 from kubernetes.client import ApiClient
+from kubernetes.client.rest import ApiException
+from urllib3.util.retry import Retry
 from app.ports.interfaces import ClusterProviderPort
 from app.domain.models import KubernetesResource, Cluster
 import yaml
 import os
+import orjson
 
 KORTEX_ANNOTATION = "kortex.io/managed"
 KORTEX_VALUE = "true"
+LIST_PAGE_SIZE = 500
+LIST_REQUEST_TIMEOUT = 30
+FIELD_MANAGER = "kortex"
+# list_resources fans out ~20 requests at once; the client default pool size is 4
+CONNECTION_POOL_MAXSIZE = 32
 
 class KubernetesAdapter(ClusterProviderPort):
     def __init__(self, kubeconfig_path: Optional[str] = None, kubeconfig_content: Optional[Dict[str, Any]] = None):
         self.kubeconfig_path = kubeconfig_path
         self.kubeconfig_content = kubeconfig_content
         self._load_config()
-        self.core_v1 = client.CoreV1Api()
-        self.apps_v1 = client.AppsV1Api()
-        self.batch_v1 = client.BatchV1Api()
-        self.networking_v1 = client.NetworkingV1Api()
-        self.rbac_v1 = client.RbacAuthorizationV1Api()
-        self.storage_v1 = client.StorageV1Api()
+        # One ApiClient (one TLS session, one connection pool) shared by every API group
+        self.api_client = ApiClient(configuration=self._tuned_configuration())
+        self.core_v1 = client.CoreV1Api(self.api_client)
+        self.apps_v1 = client.AppsV1Api(self.api_client)
+        self.batch_v1 = client.BatchV1Api(self.api_client)
+        self.networking_v1 = client.NetworkingV1Api(self.api_client)
+        self.rbac_v1 = client.RbacAuthorizationV1Api(self.api_client)
+        self.storage_v1 = client.StorageV1Api(self.api_client)
+        self._dynamic_client = None
 
     def _load_config(self):
         if self.kubeconfig_content:
@@ -34,6 +46,12 @@ class KubernetesAdapter(ClusterProviderPort):
             except config.ConfigException:
                 config.load_kube_config()
 
+    def _tuned_configuration(self) -> client.Configuration:
+        cfg = client.Configuration.get_default_copy()
+        cfg.connection_pool_maxsize = CONNECTION_POOL_MAXSIZE
+        cfg.retries = Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+        return cfg
+
     def check_connection(self) -> bool:
         try:
             self.core_v1.list_node(limit=1, _request_timeout=3)
@@ -43,54 +61,125 @@ class KubernetesAdapter(ClusterProviderPort):
             return False
 
     def list_resources(self, namespaces: List[str] = None) -> List[KubernetesResource]:
-        resources = []
-        
-        # Helper to safely fetch and append
+        jobs = [
+            # Nodes
+            (self.core_v1.list_node, "Node"),
+
+            # Namespaces
+            (self.core_v1.list_namespace, "Namespace"),
+
+            # --- Workloads ---
+            (self.apps_v1.list_deployment_for_all_namespaces, "Deployment"),
+            (self.apps_v1.list_stateful_set_for_all_namespaces, "StatefulSet"),
+            (self.apps_v1.list_daemon_set_for_all_namespaces, "DaemonSet"),
+            (self.apps_v1.list_replica_set_for_all_namespaces, "ReplicaSet"),
+            (self.batch_v1.list_job_for_all_namespaces, "Job"),
+            (self.batch_v1.list_cron_job_for_all_namespaces, "CronJob"),
+            (self.core_v1.list_pod_for_all_namespaces, "Pod"),
+
+            # --- Network ---
+            (self.core_v1.list_service_for_all_namespaces, "Service"),
+            (self.networking_v1.list_ingress_for_all_namespaces, "Ingress"),
+
+            # --- Config & Storage ---
+            (self.core_v1.list_config_map_for_all_namespaces, "ConfigMap"),
+            (self.core_v1.list_secret_for_all_namespaces, "Secret"),
+            (self.core_v1.list_persistent_volume_claim_for_all_namespaces, "PersistentVolumeClaim"),
+            (self.core_v1.list_persistent_volume, "PersistentVolume"),
+            (self.storage_v1.list_storage_class, "StorageClass"),
+
+            # --- Access / RBAC ---
+            (self.core_v1.list_service_account_for_all_namespaces, "ServiceAccount"),
+            (self.rbac_v1.list_role_for_all_namespaces, "Role"),
+            (self.rbac_v1.list_role_binding_for_all_namespaces, "RoleBinding"),
+            (self.rbac_v1.list_cluster_role, "ClusterRole"),
+            (self.rbac_v1.list_cluster_role_binding, "ClusterRoleBinding"),
+        ]
+
+        # Helper to safely fetch one kind
         def fetch_safe(fetch_func, kind):
             try:
-                items = fetch_func().items
-                for i in items:
-                    resources.append(self._to_domain(i, kind))
+                return self._bulk_to_domain(list(self._paginate(fetch_func)), kind)
             except Exception as e:
                 print(f"Error fetching {kind}: {e}")
+                return []
 
-        # Nodes
-        fetch_safe(self.core_v1.list_node, "Node")
-        
-        # Namespaces
-        fetch_safe(self.core_v1.list_namespace, "Namespace")
-
-        # --- Workloads ---
-        fetch_safe(self.apps_v1.list_deployment_for_all_namespaces, "Deployment")
-        fetch_safe(self.apps_v1.list_stateful_set_for_all_namespaces, "StatefulSet")
-        fetch_safe(self.apps_v1.list_daemon_set_for_all_namespaces, "DaemonSet")
-        fetch_safe(self.apps_v1.list_replica_set_for_all_namespaces, "ReplicaSet")
-        fetch_safe(self.batch_v1.list_job_for_all_namespaces, "Job")
-        fetch_safe(self.batch_v1.list_cron_job_for_all_namespaces, "CronJob")
-        fetch_safe(self.core_v1.list_pod_for_all_namespaces, "Pod")
-
-        # --- Network ---
-        fetch_safe(self.core_v1.list_service_for_all_namespaces, "Service")
-        fetch_safe(self.networking_v1.list_ingress_for_all_namespaces, "Ingress")
-
-        # --- Config & Storage ---
-        fetch_safe(self.core_v1.list_config_map_for_all_namespaces, "ConfigMap")
-        fetch_safe(self.core_v1.list_secret_for_all_namespaces, "Secret")
-        fetch_safe(self.core_v1.list_persistent_volume_claim_for_all_namespaces, "PersistentVolumeClaim")
-        fetch_safe(self.core_v1.list_persistent_volume, "PersistentVolume")
-        fetch_safe(self.storage_v1.list_storage_class, "StorageClass")
-
-        # --- Access / RBAC ---
-        fetch_safe(self.core_v1.list_service_account_for_all_namespaces, "ServiceAccount")
-        fetch_safe(self.rbac_v1.list_role_for_all_namespaces, "Role")
-        fetch_safe(self.rbac_v1.list_role_binding_for_all_namespaces, "RoleBinding")
-        fetch_safe(self.rbac_v1.list_cluster_role, "ClusterRole")
-        fetch_safe(self.rbac_v1.list_cluster_role_binding, "ClusterRoleBinding")
+        # The kubernetes client is blocking, so overlap the round-trips in threads
+        # and keep the merged result in the original kind order.
+        with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            futures = [executor.submit(fetch_safe, fn, kind) for fn, kind in jobs]
 
+        resources = []
+        for future in futures:
+            resources.extend(future.result())
         return resources
 
+    def _paginate(self, fetch_func, **kwargs):
+        # Page through the collection so the apiserver never has to return
+        # (and we never have to hold) a whole kind in one response.
+        # _preload_content=False hands back the raw body, so items come out as
+        # plain K8s JSON dicts without building the generated model objects.
+        cont = None
+        while True:
+            resp = fetch_func(
+                limit=LIST_PAGE_SIZE,
+                _continue=cont,
+                _request_timeout=LIST_REQUEST_TIMEOUT,
+                _preload_content=False,
+                **kwargs
+            )
+            try:
+                body = orjson.loads(resp.data)
+            finally:
+                resp.release_conn()
+            yield from body.get("items") or []
+            cont = (body.get("metadata") or {}).get("continue")
+            if not cont:
+                break
+
+    def _readers(self) -> Dict[str, Any]:
+        # kind -> (read function, namespaced); mirrors the kinds list_resources returns
+        return {
+            "Node": (self.core_v1.read_node, False),
+            "Namespace": (self.core_v1.read_namespace, False),
+            "Deployment": (self.apps_v1.read_namespaced_deployment, True),
+            "StatefulSet": (self.apps_v1.read_namespaced_stateful_set, True),
+            "DaemonSet": (self.apps_v1.read_namespaced_daemon_set, True),
+            "ReplicaSet": (self.apps_v1.read_namespaced_replica_set, True),
+            "Job": (self.batch_v1.read_namespaced_job, True),
+            "CronJob": (self.batch_v1.read_namespaced_cron_job, True),
+            "Pod": (self.core_v1.read_namespaced_pod, True),
+            "Service": (self.core_v1.read_namespaced_service, True),
+            "Ingress": (self.networking_v1.read_namespaced_ingress, True),
+            "ConfigMap": (self.core_v1.read_namespaced_config_map, True),
+            "Secret": (self.core_v1.read_namespaced_secret, True),
+            "PersistentVolumeClaim": (self.core_v1.read_namespaced_persistent_volume_claim, True),
+            "PersistentVolume": (self.core_v1.read_persistent_volume, False),
+            "StorageClass": (self.storage_v1.read_storage_class, False),
+            "ServiceAccount": (self.core_v1.read_namespaced_service_account, True),
+            "Role": (self.rbac_v1.read_namespaced_role, True),
+            "RoleBinding": (self.rbac_v1.read_namespaced_role_binding, True),
+            "ClusterRole": (self.rbac_v1.read_cluster_role, False),
+            "ClusterRoleBinding": (self.rbac_v1.read_cluster_role_binding, False),
+        }
+
     def get_resource(self, kind: str, name: str, namespace: str) -> Optional[KubernetesResource]:
-        pass
+        reader = self._readers().get(kind)
+        if reader is None:
+            return None
+        read_func, namespaced = reader
+        args = (name, namespace) if namespaced else (name,)
+        try:
+            resp = read_func(*args, _request_timeout=LIST_REQUEST_TIMEOUT, _preload_content=False)
+        except ApiException as e:
+            if e.status == 404:
+                return None
+            raise
+        try:
+            body = orjson.loads(resp.data)
+        finally:
+            resp.release_conn()
+        return self._to_domain(body, kind)
 
     def delete_resource(self, kind: str, name: str, namespace: str) -> bool:
         # Simplest: use kubectl delete
@@ -120,9 +209,8 @@ class KubernetesAdapter(ClusterProviderPort):
         return managed
 
     def apply_manifest(self, manifest: Dict[str, Any], namespace: str) -> bool:
-        # Use kubectl apply for robustness
-        import json
-        import subprocess
+        # Server-side apply through the already authenticated API client instead of
+        # forking kubectl, which re-parses kubeconfig and opens a new TLS session
         
         # Inject Annotation
         if "metadata" not in manifest:
@@ -131,48 +219,40 @@ class KubernetesAdapter(ClusterProviderPort):
             manifest["metadata"]["annotations"] = {}
         
         manifest["metadata"]["annotations"][KORTEX_ANNOTATION] = KORTEX_VALUE
+        # Apply requests are rejected if they carry managedFields (LLM fixes often copy them)
+        manifest["metadata"].pop("managedFields", None)
 
-        manifest_json = json.dumps(manifest)
-        
-        # Ensure we use the correct kubectl if bundled or relying on PATH
-        kubectl_cmd = "kubectl"
-        
-        cmd = [kubectl_cmd, "apply", "-f", "-"]
-        if namespace:
-             # NOTE: valid manifests often include namespace. Overriding it might be okay.
-            cmd.extend(["-n", namespace])
-            
-        # If we have a specific kubeconfig path, use it
-        env = os.environ.copy()
-        if self.kubeconfig_path:
-            env["KUBECONFIG"] = self.kubeconfig_path
+        if not manifest.get("apiVersion") or not manifest.get("kind"):
+            raise RuntimeError("Manifest is missing apiVersion or kind")
             
         try:
-            process = subprocess.Popen(
-                cmd, 
-                stdin=subprocess.PIPE, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE,
-                env=env
+            api = self._dynamic.resources.get(api_version=manifest["apiVersion"], kind=manifest["kind"])
+            # NOTE: valid manifests often include namespace. Overriding it might be okay.
+            target_namespace = (namespace or manifest["metadata"].get("namespace")) if api.namespaced else None
+            api.server_side_apply(
+                body=manifest,
+                namespace=target_namespace,
+                field_manager=FIELD_MANAGER,
+                force_conflicts=True
             )
-            out, err = process.communicate(input=manifest_json.encode())
-            
-            if process.returncode != 0:
-                error_details = err.decode()
-                print(f"Kubectl apply failed: {error_details}")
-                raise RuntimeError(f"Kubectl apply failed: {error_details}")
             return True
-        except FileNotFoundError:
-             raise RuntimeError("kubectl binary not found in PATH")
+        except ApiException as e:
+            error_details = e.body or str(e)
+            print(f"Server-side apply failed: {error_details}")
+            raise RuntimeError(f"Server-side apply failed: {error_details}")
         except Exception as e:
-            print(f"Kubectl execution failed: {e}")
+            print(f"Server-side apply failed: {e}")
             raise e
 
-    def _to_domain(self, k8s_obj: Any, kind: str) -> KubernetesResource:
-        # Use ApiClient to get standard K8s JSON (camelCase) instead of python snake_case
-        api_client = ApiClient()
-        obj_dict = api_client.sanitize_for_serialization(k8s_obj)
-        
+    @property
+    def _dynamic(self) -> dynamic.DynamicClient:
+        # Built on first use: DynamicClient runs API discovery when constructed
+        if self._dynamic_client is None:
+            self._dynamic_client = dynamic.DynamicClient(self.api_client)
+        return self._dynamic_client
+
+    def _to_domain(self, obj_dict: Dict[str, Any], kind: str) -> KubernetesResource:
+        # obj_dict is already standard K8s JSON (camelCase), straight from the API
         meta = obj_dict.get("metadata", {})
         
         namespace = meta.get("namespace")
@@ -187,3 +267,23 @@ class KubernetesAdapter(ClusterProviderPort):
             content=obj_dict,
             unique_id=f"{kind}/{namespace}/{meta.get('name')}"
         )
+
+    def _bulk_to_domain(self, items: List[Dict[str, Any]], kind: str) -> List[KubernetesResource]:
+        # Pull the metadata columns out in one pass each, then build every
+        # resource in a single comprehension instead of per-item helper calls
+        metas = [it.get("metadata") or {} for it in items]
+        names = [m.get("name") for m in metas]
+        namespaces = [m.get("namespace") or "default" for m in metas]
+        api_versions = [it.get("apiVersion", "v1") for it in items]
+
+        return [
+            KubernetesResource(
+                kind=kind,
+                name=name,
+                namespace=namespace,
+                api_version=api_version,
+                content=item,
+                unique_id=f"{kind}/{namespace}/{name}"
+            )
+            for name, namespace, api_version, item in zip(names, namespaces, api_versions, items)
+        ]
@@ -1,90 +1,361 @@
-from typing import List, Any
+from typing import List, Any, Optional, AsyncIterator, Union
 from app.ports.interfaces import LLMProviderPort
 from app.domain.models import AnalysisResult, KubernetesResource, RemediationStep, Issue, Severity, IssueCategory
+from app.services.llm_guard import is_rate_limited
 from langchain_community.chat_models import ChatOllama
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import SystemMessage
 from langchain_core.output_parsers import PydanticOutputParser
+from pydantic import TypeAdapter
+from collections import OrderedDict
+import asyncio
+import hashlib
+import httpx
+import diskcache
+import orjson
 import json
+import re
+
+_ISSUES_ARRAY_RE = re.compile(r'"issues"\s*:\s*\[')
+_JSON_DECODER = json.JSONDecoder()
+# Derived from the enums so a new level or category needs no change here
+_VALID_SEVERITIES = frozenset(s.value for s in Severity)
+_VALID_CATEGORIES = frozenset(c.value for c in IssueCategory)
+# Spellings models actually produce, mapped straight to the enum value so the
+# common cases cost one dict lookup instead of .upper() plus a membership test
+_SEV_MAP = {k: v for v in _VALID_SEVERITIES for k in (v, v.lower(), v.capitalize())}
+_CAT_MAP = {k: v for v in _VALID_CATEGORIES for k in (v, v.lower(), v.capitalize())}
+# Compiled once; validate_python skips BaseModel.__init__ kwargs unpacking
+_ISSUE_ADAPTER = TypeAdapter(Issue)
+
+class _IssueStreamParser:
+    """
+    Pulls complete objects out of the "issues" array of a streamed JSON response,
+    so each issue can be handled while the model is still generating the rest.
+    """
+    def __init__(self):
+        self.text = ""
+        self.complete = False # True once the closing ']' of the array was seen
+        self._pos = None
+
+    def feed(self, chunk: str) -> List[dict]:
+        self.text += chunk
+        items = []
+        if self.complete:
+            return items
+
+        if self._pos is None:
+            match = _ISSUES_ARRAY_RE.search(self.text)
+            if not match:
+                return items
+            self._pos = match.end()
+
+        buf = self.text
+        while True:
+            pos = self._pos
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            self._pos = pos
+            if pos >= len(buf):
+                break
+            if buf[pos] == "]":
+                self.complete = True
+                break
+            try:
+                item, self._pos = _JSON_DECODER.raw_decode(buf, pos)
+            except ValueError:
+                break # Item not fully streamed yet
+            if isinstance(item, dict):
+                items.append(item)
+        return items
+
+def _dumps(o: Any) -> str:
+    # Compact encoding for prompt payloads; manifests parsed from YAML can carry
+    # non-string keys (e.g. integer ConfigMap keys), which plain orjson rejects
+    return orjson.dumps(o, option=orjson.OPT_NON_STR_KEYS).decode()
+
+def _extract_json(content: str) -> str:
+    # Slice out the outermost object in one scan; drops ```json fences and any
+    # commentary the model put around it without building intermediate strings
+    if content.startswith("{") and content.endswith("}"):
+        return content # Common case with JSON mode: already bare, no copy
+    start = content.find("{")
+    end = content.rfind("}") + 1
+    if start >= 0 and end > start:
+        return content[start:end]
+    return content.strip()
+
+# Serialized analyze_context summaries keyed by (unique_id, resourceVersion).
+# A resourceVersion changes on every write, so a hit is always current.
+SUMMARY_CACHE_SIZE = 8192
+_summary_cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+
+# A tuple rather than a frozenset so the key order (and so the prompt bytes)
+# is stable across processes
+_SUMMARY_METADATA_KEYS = ("labels", "annotations")
+
+def _summarize(r: KubernetesResource, meta: dict) -> dict:
+    # Include essential fields, exclude extensive status/managedFields.
+    # Probe the two wanted keys instead of scanning every metadata item.
+    return {
+        "kind": r.kind,
+        "name": r.name,
+        "namespace": r.namespace,
+        "uid": r.unique_id,
+        "spec": r.content.get("spec") or {},
+        "metadata": {k: meta[k] for k in _SUMMARY_METADATA_KEYS if k in meta}
+    }
+
+def _serialize_summary(r: KubernetesResource) -> bytes:
+    meta = r.content.get("metadata") or {}
+    rv = meta.get("resourceVersion")
+    key = (r.unique_id, rv)
+    if rv:
+        cached = _summary_cache.get(key)
+        if cached is not None:
+            _summary_cache.move_to_end(key)
+            return cached
+
+    blob = orjson.dumps(_summarize(r, meta), option=orjson.OPT_NON_STR_KEYS)
+
+    if rv:
+        _summary_cache[key] = blob
+        if len(_summary_cache) > SUMMARY_CACHE_SIZE:
+            _summary_cache.popitem(last=False)
+    return blob
+
+def _normalize_issue(i: dict) -> Optional[Issue]:
+    try:
+        # Fix common type mismatches in issues
+        if "severity" in i:
+            sev = i["severity"]
+            # Fallback for unknown severities
+            i["severity"] = _SEV_MAP.get(sev) or _SEV_MAP.get(str(sev).upper(), "LOW")
+
+        if "category" in i:
+            cat = i["category"]
+            i["category"] = _CAT_MAP.get(cat) or str(cat).upper()
+
+        return _ISSUE_ADAPTER.validate_python(i)
+    except Exception as e:
+        print(f"Skipping invalid issue: {i} - {e}")
+        return None # Skip malformed issues
+
+RESOURCE_ANALYSIS_EXAMPLE = {
+    "summary": "The resource is generally healthy but lacks resource limits, which could lead to node instability.",
+    "issues": [
+        {
+            "severity": "MEDIUM",
+            "category": "PERFORMANCE",
+            "title": "Missing Resource Limits",
+            "description": "The container 'app' has no resource limits defined.",
+            "remediation_suggestion": {
+                "description": "Add resources.limits to the container spec.",
+                "action_type": "PATCH",
+                "manifest": {},
+                "target_resource_id": "target-id"
+            }
+        }
+    ]
+}
+
+# Manually constructing schema prompt because parser.get_format_instructions() can be verbose or specific
+REMEDIATION_SCHEMA_JSON = '''
+        {
+            "description": "Explanation of the fix",
+            "action_type": "APPLY",
+            "manifest": { ... full valid kubernetes manifest ... },
+            "target_resource_id": "original_resource_uid"
+        }
+        '''
+
+CONTEXT_ANALYSIS_EXAMPLE = {
+    "summary": "The namespace contains several critical security issues, including privileged containers and missing resource limits.",
+    "issues": [
+        {
+            "severity": "HIGH",
+            "category": "SECURITY",
+            "title": "Privileged Container Detected",
+            "description": "The pod 'nginx-app' is running as privileged.",
+            "affected_resource_ids": ["uid-123"],
+            "remediation_suggestion": {
+                "description": "Remove securityContext.privileged flag.",
+                "action_type": "PATCH",
+                "manifest": {},
+                "target_resource_id": "uid-123"
+            }
+        }
+    ]
+}
+
+# Static system prompts with the examples baked in. Passed as SystemMessage
+# objects so the JSON braces are not treated as template variables.
+CONTEXT_ANALYSIS_SYSTEM_PROMPT = (
+    "You are a Senior Kubernetes Site Reliability Engineer available to analyze cluster resources.\n\n"
+    "The user message contains the CONTEXT RESOURCES (JSON) followed by an INSTRUCTION.\n\n"
+    "CRITICAL OUTPUT RULES:\n"
+    "1. Respond ONLY with valid JSON. Do not include markdown keys or explanations outside the JSON.\n"
+    "2. You MUST return an object with 'summary' (string) and 'issues' (list of objects).\n"
+    "3. For each issue, you MUST valid 'affected_resource_ids' from the Context.\n"
+    "4. Use the following exact JSON schema:\n"
+    + orjson.dumps(CONTEXT_ANALYSIS_EXAMPLE).decode()
+)
+
+RESOURCE_ANALYSIS_SYSTEM_PROMPT = (
+    "You are a Kubernetes Expert. Your goal is to analyze the target resource configuration and return a JSON response.\n\n"
+    "The user message contains a CONTEXT SUMMARY of the cluster followed by the TARGET RESOURCE.\n\n"
+    "CRITICAL INSTRUCTIONS:\n"
+    "1. Return ONLY valid JSON. No markdown, no explanations outside JSON.\n"
+    "2. You must include a 'summary' field (string) explaining if the resource is healthy or has issues. If healthy, explain WHY (e.g. 'Readiness probe is configured').\n"
+    "3. You must include an 'issues' field (list). If no issues, return [].\n"
+    "4. CONSISTENCY CHECK: If you mention an improvement in the summary (e.g. 'could benefit from resource limits'), you MUST create an issue for it in the 'issues' list.\n"
+    "5. Follow this EXACT schema:\n"
+    + orjson.dumps(RESOURCE_ANALYSIS_EXAMPLE).decode()
+)
+
+REMEDIATION_SYSTEM_PROMPT = (
+    "You are a Kubernetes Automation Engineer. You fix misconfigurations.\n\n"
+    "The user message contains the Target Resource and the Issue to Fix.\n"
+    "Task: Generate a corrected Kubernetes manifest that resolves the issue.\n"
+    "CRITICAL RULES:\n"
+    "1. The 'manifest' field MUST contain the COMPLETE valid Kubernetes resource definition (including apiVersion, Kind, metadata, spec).\n"
+    "2. Do NOT summarize or truncate the manifest. It must be apply-able via kubectl.\n"
+    "3. Maintain all other configurations (names, labels, images) exactly as is, only modify what is needed to fix the issue.\n"
+    "4. Return a JSON object matching this structure:\n"
+    + REMEDIATION_SCHEMA_JSON
+)
+
+# Exact-match response cache shared by every adapter; opened on first use.
+# Kept outside data/, which the archive export/import copies wholesale.
+LLM_CACHE_DIR = "cache/llm"
+LLM_CACHE_SIZE_LIMIT = 1 << 30
+_response_cache: Optional[diskcache.Cache] = None
+
+def _get_response_cache() -> diskcache.Cache:
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = diskcache.Cache(LLM_CACHE_DIR, size_limit=LLM_CACHE_SIZE_LIMIT)
+    return _response_cache
 
 class LangChainAdapter(LLMProviderPort):
     def __init__(self, provider: str = "ollama", model_name: str = "llama3"):
         self.provider = provider
+        self.model_name = model_name
+        self._http: Optional[httpx.AsyncClient] = None
         if provider == "openai":
-            self.llm = ChatOpenAI(model_name=model_name or "gpt-4-turbo")
+            # One pooled HTTP/2 client so concurrent analyses multiplex over a
+            # single connection instead of queueing for HTTP/1.1 slots
+            self._http = httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+                timeout=httpx.Timeout(120.0)
+            )
+            self.llm = ChatOpenAI(model_name=model_name or "gpt-4-turbo", http_async_client=self._http)
         else:
             self.llm = ChatOllama(model=model_name or "llama3", format="json")
             
         self.parser = PydanticOutputParser(pydantic_object=AnalysisResult)
 
+        # Prompts are invariant, build them once per adapter. The instructions and
+        # schema live in a static system message ahead of the per-request data so
+        # providers with prefix caching (OpenAI, Ollama's KV cache) can reuse them.
+        self._context_prompt = ChatPromptTemplate.from_messages([
+            SystemMessage(content=CONTEXT_ANALYSIS_SYSTEM_PROMPT),
+            ("user", "CONTEXT RESOURCES (JSON):\n{context}\n\n"
+                     "INSTRUCTION: {query}")
+        ])
+
+        self._resource_prompt = ChatPromptTemplate.from_messages([
+            SystemMessage(content=RESOURCE_ANALYSIS_SYSTEM_PROMPT),
+            ("user", "CONTEXT SUMMARY (one [kind, name, namespace, uid] row per resource):\n{context}\n\n"
+                     "TARGET RESOURCE:\n{target}")
+        ])
+
+        self._remediation_prompt = ChatPromptTemplate.from_messages([
+            SystemMessage(content=REMEDIATION_SYSTEM_PROMPT),
+            ("user", "Target Resource:\n{resource}\n\nIssue to Fix:\n{issue}")
+        ])
+
+        self._context_chain = self._context_prompt | self.llm
+        self._resource_chain = self._resource_prompt | self.llm
+        self._remediation_chain = self._remediation_prompt | self.llm
+
+    def _cache_key(self, method: str, *parts: str) -> str:
+        # The static system prompts are module constants, so provider, model and
+        # the per-request inputs fully determine the prompt that gets sent
+        h = hashlib.sha256()
+        for part in (self.provider, self.model_name or "", method, *parts):
+            h.update(part.encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _cache_get(self, key: str, model_cls):
+        try:
+            cached = _get_response_cache().get(key)
+            return model_cls.model_validate_json(cached) if cached is not None else None
+        except Exception as e:
+            print(f"LLM cache read failed: {e}")
+            return None
+
+    def _cache_put(self, key: str, result):
+        try:
+            _get_response_cache().set(key, result.model_dump_json())
+        except Exception as e:
+            print(f"LLM cache write failed: {e}")
+
     async def analyze_context(self, context: List[KubernetesResource], query: str) -> AnalysisResult:
+        result = None
+        async for item in self.analyze_context_stream(context, query):
+            if isinstance(item, AnalysisResult):
+                result = item
+        return result
+
+    async def analyze_context_stream(self, context: List[KubernetesResource], query: str) -> AsyncIterator[Union[Issue, AnalysisResult]]:
+        """
+        Yields each Issue as soon as the model finishes writing it, then the
+        complete AnalysisResult as the last item.
+        """
         # Create a condensed context string to save tokens and focus attention
-        context_summary = []
-        for r in context:
-            # Include essential fields, exclude extensive status/managedFields
-            summary = {
-                "kind": r.kind,
-                "name": r.name,
-                "namespace": r.namespace,
-                "uid": r.unique_id,
-                "spec": r.content.get("spec", {}),
-                "metadata": {k: v for k, v in r.content.get("metadata", {}).items() if k in ["labels", "annotations"]}
-            }
-            context_summary.append(summary)
-            
-        context_str = json.dumps(context_summary, indent=2)
-        
-        example_output = {
-            "summary": "The namespace contains several critical security issues, including privileged containers and missing resource limits.",
-            "issues": [
-                {
-                    "severity": "HIGH",
-                    "category": "SECURITY",
-                    "title": "Privileged Container Detected",
-                    "description": "The pod 'nginx-app' is running as privileged.",
-                    "affected_resource_ids": ["uid-123"],
-                    "remediation_suggestion": {
-                        "description": "Remove securityContext.privileged flag.",
-                        "action_type": "PATCH",
-                        "manifest": {},
-                        "target_resource_id": "uid-123"
-                    }
-                }
-            ]
-        }
-        example_str = json.dumps(example_output, indent=2)
+        # Unchanged resources reuse their serialized summary from earlier queries
+        context_str = (b"[" + b",".join(_serialize_summary(r) for r in context) + b"]").decode()
 
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are a Senior Kubernetes Site Reliability Engineer available to analyze cluster resources."),
-            ("user", "CONTEXT RESOURCES (JSON):\n{context}\n\n"
-                     "INSTRUCTION: {query}\n\n"
-                     "CRITICAL OUTPUT RULES:\n"
-                     "1. Respond ONLY with valid JSON. Do not include markdown keys or explanations outside the JSON.\n"
-                     "2. You MUST return an object with 'summary' (string) and 'issues' (list of objects).\n"
-                     "3. For each issue, you MUST valid 'affected_resource_ids' from the Context.\n"
-                     "4. Use the following exact JSON schema:\n{example_str}\n\n"
-                     "START ANALYSIS AND GENERATE JSON:")
-        ])
+        cache_key = self._cache_key("analyze_context", context_str, query)
+        cached = self._cache_get(cache_key, AnalysisResult)
+        if cached is not None:
+            for issue in cached.issues:
+                yield issue
+            yield cached
+            return
         
-        # Remove parser from chain to avoid validation errors on raw output
-        chain = prompt | self.llm
+        # Parser is left out of the chain to avoid validation errors on raw output
+        chain = self._context_chain
         
         try:
-            response = await chain.ainvoke({
+            stream_parser = _IssueStreamParser()
+            streamed_issues = []
+            streamed_count = 0 # raw array items seen, including ones that failed validation
+            async for chunk in chain.astream({
                 "context": context_str, 
-                "query": query,
-                "example_str": example_str
-            })
+                "query": query
+            }):
+                text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                for i in stream_parser.feed(text):
+                    streamed_count += 1
+                    issue = _normalize_issue(i)
+                    if issue:
+                        streamed_issues.append(issue)
+                        yield issue
             
             # Manual Parsing Logic (Same as analyze_resource)
-            content = response.content if hasattr(response, 'content') else str(response)
-            content = content.replace("```json", "").replace("```", "").strip()
+            content = _extract_json(stream_parser.text)
             
             try:
-                data = json.loads(content)
-            except json.JSONDecodeError:
+                data = orjson.loads(content)
+            except orjson.JSONDecodeError:
                 print(f"Failed to parse JSON content: {content[:200]}...")
-                return AnalysisResult(summary="Analysis failed: Invalid JSON output from AI.", issues=[])
+                yield AnalysisResult(summary="Analysis failed: Invalid JSON output from AI.", issues=[], failed=True)
+                return
 
             # Smart Unwrapping
             if "summary" not in data and "issues" not in data:
@@ -96,99 +367,78 @@ class LangChainAdapter(LLMProviderPort):
             # Extract Summary
             summary_raw = data.get("summary", "Analysis completed.")
             if isinstance(summary_raw, (list, dict)):
-                summary = json.dumps(summary_raw)
+                summary = orjson.dumps(summary_raw).decode()
             else:
                 summary = str(summary_raw)
 
             # Extract Issues
-            issues_data = data.get("issues", [])
-            issues = []
-            for i in issues_data:
-                try:
-                    # Severity Normalization
-                    if "severity" in i:
-                        i["severity"] = i["severity"].upper()
-                        if i["severity"] not in ["LOW", "MEDIUM", "HIGH", "CRITICAL"]:
-                            i["severity"] = "LOW"
-                    if "category" in i:
-                         i["category"] = i["category"].upper()
-                    
-                    issues.append(Issue(**i))
-                except Exception as e:
-                    print(f"Skipping invalid issue: {e}")
-                    continue
+            issues = streamed_issues
+            if not stream_parser.complete:
+                # The array never closed cleanly while streaming, so pick up the
+                # items after the ones already yielded from the parsed document
+                for i in data.get("issues", [])[streamed_count:]:
+                    issue = _normalize_issue(i)
+                    if issue:
+                        issues.append(issue)
+                        yield issue
             
-            return AnalysisResult(summary=summary, issues=issues)
+            result = AnalysisResult(summary=summary, issues=issues)
+            self._cache_put(cache_key, result)
+            yield result
 
         except Exception as e:
+            if is_rate_limited(e):
+                raise # Let call_llm_with_retry back off and try again
             print(f"LLM Error in analyze_context: {e}")
-            return AnalysisResult(summary=f"Analysis failed due to error: {str(e)}", issues=[])
+            yield AnalysisResult(summary=f"Analysis failed due to error: {str(e)}", issues=[], failed=True)
 
     async def analyze_resource(self, target: KubernetesResource, context: List[KubernetesResource]) -> AnalysisResult:
         # Context strategy: Filter to relevant namespace + cluster scoped to reduce noise?
         # For now, let's include everything but maybe summarized to save tokens
         
-        # Summary for context to reduce tokens
-        context_summary = [{"kind": r.kind, "name": r.name, "namespace": r.namespace, "uid": r.unique_id} for r in context]
-        context_str = json.dumps(context_summary, indent=2)
-        target_str = json.dumps(target.dict(exclude={'content': {'managedFields'}}), indent=2)
-        
-        example_output = {
-            "summary": "The resource is generally healthy but lacks resource limits, which could lead to node instability.",
-            "issues": [
-                {
-                    "severity": "MEDIUM",
-                    "category": "PERFORMANCE",
-                    "title": "Missing Resource Limits",
-                    "description": "The container 'app' has no resource limits defined.",
-                    "remediation_suggestion": {
-                        "description": "Add resources.limits to the container spec.",
-                        "action_type": "PATCH",
-                        "manifest": {},
-                        "target_resource_id": "target-id"
-                    }
-                }
-            ]
-        }
-        example_str = json.dumps(example_output, indent=2)
-
-        prompt = ChatPromptTemplate.from_messages([
-            ("user", "You are a Kubernetes Expert. Your goal is to analyze the target resource configuration and return a JSON response.\n\n"
-                     "CONTEXT SUMMARY:\n{context}\n\n"
-                     "TARGET RESOURCE:\n{target}\n\n"
-                     "CRITICAL INSTRUCTIONS:\n"
-                     "1. Return ONLY valid JSON. No markdown, no explanations outside JSON.\n"
-                     "2. You must include a 'summary' field (string) explaining if the resource is healthy or has issues. If healthy, explain WHY (e.g. 'Readiness probe is configured').\n"
-                     "3. You must include an 'issues' field (list). If no issues, return [].\n"
-                     "4. CONSISTENCY CHECK: If you mention an improvement in the summary (e.g. 'could benefit from resource limits'), you MUST create an issue for it in the 'issues' list.\n"
-                     "5. Follow this EXACT schema:\n"
-                     "{example_str}\n\n"
-                     "GENERATE JSON NOW:")
-        ])
+        # Summary for context to reduce tokens: one [kind, name, namespace, uid] row
+        # per resource instead of a dict, which repeats the keys for every entry
+        context_summary = [(r.kind, r.name, r.namespace, r.unique_id) for r in context]
+        context_str = _dumps(context_summary)
+        # Serialize straight from pydantic-core; managedFields lives under metadata
+        target_str = target.model_dump_json(exclude={'content': {'metadata': {'managedFields'}}})
+
+        cache_key = self._cache_key("analyze_resource", context_str, target_str)
+        cached = self._cache_get(cache_key, AnalysisResult)
+        if cached is not None:
+            return cached
         
         # Determine strictness via direct string parsing to be more robust
-        chain = prompt | self.llm
+        chain = self._resource_chain
         
         try:
-            response = await chain.ainvoke({
+            # Stream the response and normalize each issue as soon as the model
+            # finishes it, overlapping that work with the rest of the generation.
+            stream_parser = _IssueStreamParser()
+            streamed_issues = []
+            async for chunk in chain.astream({
                 "context": context_str, 
-                "target": target_str, 
-                "example_str": example_str
-            })
+                "target": target_str
+            }):
+                text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                for i in stream_parser.feed(text):
+                    issue = _normalize_issue(i)
+                    if issue:
+                        streamed_issues.append(issue)
             
             # Extract text
-            content = response.content if hasattr(response, 'content') else str(response)
+            content = stream_parser.text
             print(f"RAW LLM RESPONSE: {content}")
             
-            # Cleaning: remove markdown code blocks if present
-            content = content.replace("```json", "").replace("```", "").strip()
+            # Cleaning: drop markdown code blocks / surrounding text if present
+            content = _extract_json(content)
             
             try:
-                data = json.loads(content)
-            except json.JSONDecodeError:
+                data = orjson.loads(content)
+            except orjson.JSONDecodeError:
                 # Fallback: maybe it didn't complete? Or has extra text?
                 print(f"Failed to parse JSON content: {content}")
-                return AnalysisResult(summary="Analysis failed: Invalid JSON output from AI.", issues=[])
+                return AnalysisResult(summary="Analysis failed: Invalid JSON output from AI.", issues=[], failed=True)
 
             # Smart Unwrapping of known wrapper keys models love to use
             if "summary" not in data and "issues" not in data:
@@ -207,87 +457,68 @@ class LangChainAdapter(LLMProviderPort):
                     summary = "\n".join(summary_raw)
                 else:
                     # If list of objects, json dump or stringify
-                    summary = json.dumps(summary_raw, indent=2)
+                    summary = orjson.dumps(summary_raw, option=orjson.OPT_INDENT_2).decode()
             elif isinstance(summary_raw, dict):
-                summary = json.dumps(summary_raw, indent=2)
+                summary = orjson.dumps(summary_raw, option=orjson.OPT_INDENT_2).decode()
             else:
                 summary = str(summary_raw)
 
-            issues_data = data.get("issues", [])
-            
-            # Normalize issues
-            issues = []
-            for i in issues_data:
-                try:
-                    # Fix common type mismatches in issues
-                    if "severity" in i:
-                        i["severity"] = i["severity"].upper()
-                        # Fallback for unknown severities
-                        if i["severity"] not in ["LOW", "MEDIUM", "HIGH", "CRITICAL"]:
-                            i["severity"] = "LOW"
-                            
-                    if "category" in i:
-                        i["category"] = i["category"].upper()
-                        
-                    issues.append(Issue(**i))
-                except Exception as e:
-                    print(f"Skipping invalid issue: {i} - {e}")
-                    continue # Skip malformed issues
+            if stream_parser.complete:
+                issues = streamed_issues
+            else:
+                # The array never closed cleanly while streaming (wrapped or odd
+                # output), so normalize from the fully parsed document instead.
+                issues = [issue for issue in map(_normalize_issue, data.get("issues", [])) if issue]
             
-            return AnalysisResult(summary=summary, issues=issues)
+            result = AnalysisResult(summary=summary, issues=issues)
+            self._cache_put(cache_key, result)
+            return result
             
         except Exception as e:
+            if is_rate_limited(e):
+                raise
             print(f"LLM Error during deep analysis: {e}")
-            return AnalysisResult(summary=f"Analysis failed: {str(e)}", issues=[])
+            return AnalysisResult(summary=f"Analysis failed: {str(e)}", issues=[], failed=True)
+
+    async def analyze_resources_batch(self, targets: List[KubernetesResource], context: List[KubernetesResource], concurrency: int = 8) -> List[AnalysisResult]:
+        # Overlap the LLM round-trips instead of awaiting them one after another;
+        # results come back in the same order as targets
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(target: KubernetesResource) -> AnalysisResult:
+            async with sem:
+                return await self.analyze_resource(target, context)
+
+        return await asyncio.gather(*(one(t) for t in targets))
 
     async def generate_remediation(self, input_data: Any) -> RemediationStep:
         resource = input_data.get("resource")
         issue = input_data.get("issue")
         
-        resource_str = json.dumps(resource, indent=2)
-        
-        # Define output schema for Parser
-        parser = PydanticOutputParser(pydantic_object=RemediationStep)
-        
-        # Manually constructing schema prompt because parser.get_format_instructions() can be verbose or specific
-        schema_json = '''
-        {
-            "description": "Explanation of the fix",
-            "action_type": "APPLY",
-            "manifest": { ... full valid kubernetes manifest ... },
-            "target_resource_id": "original_resource_uid"
-        }
-        '''
+        resource_str = _dumps(resource)
 
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are a Kubernetes Automation Engineer. You fix misconfigurations."),
-            ("user", "Target Resource:\n{resource}\n\nIssue to Fix:\n{issue}\n\n"
-                     "Task: Generate a corrected Kubernetes manifest that resolves the issue.\n"
-                     "CRITICAL RULES:\n"
-                     "1. The 'manifest' field MUST contain the COMPLETE valid Kubernetes resource definition (including apiVersion, Kind, metadata, spec).\n"
-                     "2. Do NOT summarize or truncate the manifest. It must be apply-able via kubectl.\n"
-                     "3. Maintain all other configurations (names, labels, images) exactly as is, only modify what is needed to fix the issue.\n"
-                     "4. Return a JSON object matching this structure:\n{schema_json}")
-        ])
+        cache_key = self._cache_key("generate_remediation", resource_str, str(issue))
+        cached = self._cache_get(cache_key, RemediationStep)
+        if cached is not None:
+            return cached
         
-        chain = prompt | self.llm
+        chain = self._remediation_chain
         
         try:
             response = await chain.ainvoke({
                 "resource": resource_str,
-                "issue": issue,
-                "schema_json": schema_json
+                "issue": issue
             })
             
             content = response.content if hasattr(response, 'content') else str(response)
-            content = content.replace("```json", "").replace("```", "").strip()
+            content = _extract_json(content)
             
-            data = json.loads(content)
+            data = orjson.loads(content)
             
             # Ensure manifest is a dict
             if isinstance(data.get("manifest"), str):
                  try:
-                     data["manifest"] = json.loads(data["manifest"])
+                     data["manifest"] = orjson.loads(_extract_json(data["manifest"]))
                  except:
                      pass
                      
@@ -304,9 +535,13 @@ class LangChainAdapter(LLMProviderPort):
                  if not manifest.get("metadata"): manifest["metadata"] = original_res.get("metadata")
                  data["manifest"] = manifest
 
-            return RemediationStep(**data)
+            remediation = RemediationStep(**data)
+            self._cache_put(cache_key, remediation)
+            return remediation
             
         except Exception as e:
+            if is_rate_limited(e):
+                raise
             print(f"Remediation Generation Failed: {e}")
             # Fallback for demo if LLM fails
             return RemediationStep(
@@ -316,6 +551,10 @@ class LangChainAdapter(LLMProviderPort):
                 target_resource_id=resource.get('unique_id', 'unknown')
             )
 
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+
     async def test_connection(self) -> bool:
         try:
             prompt = ChatPromptTemplate.from_messages([("user", "Hello, are you there?")])
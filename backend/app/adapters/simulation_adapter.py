@@ -1,11 +1,28 @@
 import asyncio
-import subprocess
 import os
+import subprocess
 import sys
 from typing import Optional
+from watchfiles import awatch
 from app.ports.interfaces import SimulationEnginePort
 from app.domain.models import Cluster
 
+async def _run(cmd, env=None, timeout: Optional[float] = None):
+    # Plain subprocess in a worker thread rather than asyncio subprocesses, which
+    # Windows' SelectorEventLoop (uvicorn --reload) does not implement.
+    # subprocess.run kills the child when the timeout fires.
+    res = await asyncio.to_thread(
+        subprocess.run, cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env,
+        timeout=timeout
+    )
+    return res.returncode, res.stdout, res.stderr
+
+def _kubeconfig_ready(path: str) -> bool:
+    return os.path.exists(path) and os.path.getsize(path) > 0
+
 class VClusterAdapter(SimulationEnginePort):
     def __init__(self, base_path: str = None):
         # Use a local temp dir or provided one
@@ -16,8 +33,13 @@ class VClusterAdapter(SimulationEnginePort):
             
         os.makedirs(self.base_path, exist_ok=True)
         
+        self._cwd = os.getcwd()
+        # Add current directory to PATH to find local tools (helm, vcluster).
+        # Built once; calls only copy it when they need their own KUBECONFIG.
+        self._base_env = {**os.environ, "PATH": self._cwd + os.pathsep + os.environ.get("PATH", "")}
+
         # Locate vcluster binary
-        self.vcluster_bin = os.path.join(os.getcwd(), "vcluster.exe") 
+        self.vcluster_bin = os.path.join(self._cwd, "vcluster.exe") 
         if not os.path.exists(self.vcluster_bin):
             # Fallback to system path
             self.vcluster_bin = "vcluster"
@@ -35,12 +57,9 @@ class VClusterAdapter(SimulationEnginePort):
         
         # Ensure strict isolation and use the source cluster as host
         # We need to set KUBECONFIG to the source cluster's config so vcluster creates it there
-        env = os.environ.copy()
+        env = self._base_env
         if source_cluster.kubeconfig_path:
-             env["KUBECONFIG"] = source_cluster.kubeconfig_path
-             
-        # Add current directory to PATH to find local tools (helm, vcluster)
-        env["PATH"] = os.getcwd() + os.pathsep + env.get("PATH", "")
+             env = {**self._base_env, "KUBECONFIG": source_cluster.kubeconfig_path}
 
         # 1. Create vcluster (Blocking, but fast with --connect=false)
         cmd_create = [
@@ -55,22 +74,11 @@ class VClusterAdapter(SimulationEnginePort):
         
         print(f"Executing VCluster Create: {' '.join(cmd_create)}")
         
-        def run_create():
-            return subprocess.run(
-                cmd_create,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                env=env,
-                check=False,
-                timeout=300 # 5 minute timeout
-            )
-
-        loop = asyncio.get_running_loop()
-        res_create = await loop.run_in_executor(None, run_create)
-        
-        if res_create.returncode != 0:
-            err_msg = res_create.stderr.decode()
-            out_msg = res_create.stdout.decode()
+        returncode, stdout, stderr = await _run(cmd_create, env=env, timeout=300) # 5 minute timeout
+        
+        if returncode != 0:
+            err_msg = stderr.decode()
+            out_msg = stdout.decode()
             full_msg = f"Stderr: {err_msg} | Stdout: {out_msg}"
             print(f"VCluster creation failed: {full_msg}")
             raise RuntimeError(f"Failed to create shadow cluster: {full_msg}")
@@ -85,10 +93,7 @@ class VClusterAdapter(SimulationEnginePort):
             f"{KORTEX_ANNOTATION}={KORTEX_VALUE}",
             "--overwrite"
         ]
-        def run_ann():
-            return subprocess.run(cmd_ann, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        
-        await loop.run_in_executor(None, run_ann)
+        await _run(cmd_ann, env=env)
 
         print("Namespace annotated. Starting background connect tunnel...")
         
@@ -105,7 +110,7 @@ class VClusterAdapter(SimulationEnginePort):
         
         cmd_connect = [str(arg) for arg in cmd_connect]
         
-        # We use Popen directly here (non-blocking)
+        # Started without waiting on it (it never exits on its own)
         # We assume 'connect' will write the file quickly then hold the connection.
         # We need to wait for the file to exist before returning.
         
@@ -119,18 +124,14 @@ class VClusterAdapter(SimulationEnginePort):
         self._bg_processes[shadow_name] = proc
         
         # Wait for kubeconfig to appear (up to 30s)
-        for i in range(30):
-            if os.path.exists(shadow_kubeconfig) and os.path.getsize(shadow_kubeconfig) > 0:
-                print("Kubeconfig generated. Tunnel active.")
-                break
-            await asyncio.sleep(1)
-            # Check if process died
-            if proc.poll() is not None:
-                stdout, stderr = proc.communicate()
-                raise RuntimeError(f"VCluster connect process died unexpectedly: {stderr.decode()}")
-        
-        if not os.path.exists(shadow_kubeconfig):
+        if await self._wait_for_kubeconfig(shadow_kubeconfig, proc, timeout=30):
+            print("Kubeconfig generated. Tunnel active.")
+        elif proc.poll() is not None:
+            stdout, stderr = await asyncio.to_thread(proc.communicate)
+            raise RuntimeError(f"VCluster connect process died unexpectedly: {stderr.decode()}")
+        else:
              proc.kill()
+             await asyncio.to_thread(proc.wait)
              raise RuntimeError("Timed out waiting for vcluster kubeconfig generation")
 
         return Cluster(
@@ -140,6 +141,36 @@ class VClusterAdapter(SimulationEnginePort):
             is_active=True
         )
 
+    async def _wait_for_kubeconfig(self, path: str, proc, timeout: float) -> bool:
+        # Wake on filesystem events instead of polling once a second. The watch
+        # is stopped early if the connect process dies.
+        if _kubeconfig_ready(path):
+            return True
+
+        stop = asyncio.Event()
+
+        async def stop_on_exit():
+            # Polled so no thread stays parked on the long-lived tunnel process
+            while proc.poll() is None:
+                await asyncio.sleep(0.5)
+            stop.set()
+
+        async def watch():
+            # yield_on_timeout also re-checks periodically, covering a file
+            # written before the watcher was set up
+            async for _ in awatch(self.base_path, stop_event=stop, rust_timeout=1000, yield_on_timeout=True):
+                if _kubeconfig_ready(path):
+                    return True
+            return _kubeconfig_ready(path)
+
+        exit_watcher = asyncio.create_task(stop_on_exit())
+        try:
+            return await asyncio.wait_for(watch(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return _kubeconfig_ready(path)
+        finally:
+            exit_watcher.cancel()
+
     async def destroy_shadow_env(self, cluster_id: str):
         # 1. Kill background tunnel if exists
         # NOTE: cluster_id here matches shadow_name from creation
@@ -148,9 +179,10 @@ class VClusterAdapter(SimulationEnginePort):
             proc = self._bg_processes[cluster_id]
             proc.terminate()
             try:
-                proc.wait(timeout=5)
-            except:
+                await asyncio.to_thread(proc.wait, 5)
+            except subprocess.TimeoutExpired:
                 proc.kill()
+                await asyncio.to_thread(proc.wait)
             del self._bg_processes[cluster_id]
 
         # 2. Delete the vcluster resource
@@ -161,15 +193,6 @@ class VClusterAdapter(SimulationEnginePort):
         # Assuming namespace == cluster_id as per creation logic
         cmd = [self.vcluster_bin, "delete", cluster_id, "-n", cluster_id]
         
-        def run_sync():
-            res = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            if res.returncode != 0:
-                 print(f"Failed to delete vcluster: {res.stderr.decode()}")
-            return res
-
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, run_sync)
+        returncode, _, stderr = await _run(cmd)
+        if returncode != 0:
+             print(f"Failed to delete vcluster: {stderr.decode()}")
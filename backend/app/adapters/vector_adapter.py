@@ -1,32 +1,99 @@
 import chromadb
-from typing import List, Dict, Any
+from functools import lru_cache
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Tuple, Callable
 from chromadb.config import Settings
 
+# Documents per upsert; the embedding function runs once per batch
+INGEST_BATCH_SIZE = 128
+SEARCH_CACHE_SIZE = 512
+COLLECTION_NAME = "k8s_docs"
+# Cosine on normalized embeddings; only applied when the collection is created
+COLLECTION_METADATA = {"hnsw:space": "cosine"}
+
+# Opening a PersistentClient opens sqlite and checks the schema, so clients,
+# collections and their search caches are shared by every adapter in the process
+_clients: Dict[str, Any] = {}
+_collections: Dict[Tuple[str, str], Any] = {}
+_search_caches: Dict[Tuple[str, str], Callable] = {}
+
+def _get_client(path: str):
+    c = _clients.get(path)
+    if c is None:
+        c = chromadb.PersistentClient(path=path)
+        _clients[path] = c
+    return c
+
+def _get_collection(path: str, name: str):
+    key = (path, name)
+    coll = _collections.get(key)
+    if coll is None:
+        coll = _get_client(path).get_or_create_collection(name=name, metadata=COLLECTION_METADATA)
+        _collections[key] = coll
+    return coll
+
+def _query(collection, queries: List[str], n_results: int) -> List[List[Dict[str, Any]]]:
+    # One query call embeds all the questions together
+    results = collection.query(
+        query_texts=list(queries),
+        n_results=n_results
+    )
+    
+    # Format results, one list per query
+    output = []
+    documents = results["documents"] or [[] for _ in queries]
+    metadatas = results["metadatas"]
+    for q, docs in enumerate(documents):
+        hits = []
+        for i, doc in enumerate(docs):
+            meta = metadatas[q][i] if metadatas else {}
+            hits.append({
+                "content": doc,
+                "metadata": meta
+            })
+        output.append(hits)
+    return output
+
 class VectorStoreAdapter:
     def __init__(self, persist_directory: str = "./chroma_db"):
-        self.client = chromadb.PersistentClient(path=persist_directory)
-        self.collection = self.client.get_or_create_collection(name="k8s_docs")
+        key = (persist_directory, COLLECTION_NAME)
+        self.client = _get_client(persist_directory)
+        self.collection = _get_collection(*key)
+        # Repeated questions skip the query embedding and the HNSW lookup.
+        # Cleared on every ingest so results never go stale.
+        self._search_cached = _search_caches.get(key)
+        if self._search_cached is None:
+            collection = self.collection
+            self._search_cached = lru_cache(maxsize=SEARCH_CACHE_SIZE)(
+                lambda query, n_results: _query(collection, [query], n_results)[0]
+            )
+            _search_caches[key] = self._search_cached
 
     def ingest_document(self, doc_id: str, content: str, metadata: Dict[str, Any]):
-        self.collection.upsert(
-            documents=[content],
-            metadatas=[metadata],
-            ids=[doc_id]
-        )
+        self.ingest_documents([(doc_id, content, metadata)])
+
+    def ingest_documents(self, docs: Iterable[Tuple[str, str, Dict[str, Any]]]):
+        # docs yields (id, content, metadata); upsert them in batches
+        it = iter(docs)
+        while True:
+            batch = list(islice(it, INGEST_BATCH_SIZE))
+            if not batch:
+                break
+            ids, contents, metadatas = zip(*batch)
+            self.collection.upsert(
+                documents=list(contents),
+                metadatas=list(metadatas),
+                ids=list(ids)
+            )
+        self._search_cached.cache_clear()
 
     def search(self, query: str, n_results: int = 3) -> List[Dict[str, Any]]:
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=n_results
-        )
-        
-        # Format results
-        output = []
-        if results["documents"]:
-            for i, doc in enumerate(results["documents"][0]):
-                meta = results["metadatas"][0][i] if results["metadatas"] else {}
-                output.append({
-                    "content": doc,
-                    "metadata": meta
-                })
-        return output
+        # The cached hits are shared by every caller; hand out copies so editing
+        # a result can't change what later identical queries get back
+        return [
+            {"content": h["content"], "metadata": dict(h["metadata"]) if h["metadata"] else h["metadata"]}
+            for h in self._search_cached(query, n_results)
+        ]
+
+    def search_batch(self, queries: List[str], n_results: int = 3) -> List[List[Dict[str, Any]]]:
+        return _query(self.collection, queries, n_results)
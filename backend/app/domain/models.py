@@ -1,7 +1,12 @@
 from enum import Enum
 from typing import Dict, List, Optional, Any
-from pydantic import BaseModel, Field
-from datetime import datetime
+from pydantic import BaseModel, ConfigDict, Field
+from datetime import datetime, timezone
+
+_UTC = timezone.utc
+
+def _utcnow() -> datetime:
+    return datetime.now(_UTC)
 
 class Severity(str, Enum):
     LOW = "LOW"
@@ -21,12 +26,12 @@ class KubernetesResource(BaseModel):
     """
     Represents a single Kubernetes object with its metadata and content.
     """
+    model_config = ConfigDict(extra="ignore")
+
     kind: str
     name: str
     namespace: str = "default"
     api_version: str
-    content: Dict[str, Any] = Field(..., description="The full raw manifest content as a dict")
-    
     content: Dict[str, Any] = Field(..., description="The full raw manifest content as a dict")
     unique_id: str = "" # Populated by adapter
 
@@ -34,6 +39,8 @@ class Cluster(BaseModel):
     """
     Represents a Kubernetes Cluster connection.
     """
+    model_config = ConfigDict(extra="ignore")
+
     id: str
     name: str
     kubeconfig_path: str
@@ -43,6 +50,8 @@ class RemediationStep(BaseModel):
     """
     A single step in a remediation plan (e.g., applying a patch).
     """
+    model_config = ConfigDict(extra="ignore")
+
     description: str
     action_type: str  # e.g., "PATCH", "APPLY", "DELETE"
     manifest: Dict[str, Any]
@@ -52,6 +61,8 @@ class Issue(BaseModel):
     """
     A detected issue within the cluster or a specific resource.
     """
+    model_config = ConfigDict(extra="ignore")
+
     severity: Severity
     category: IssueCategory
     title: str
@@ -64,15 +75,20 @@ class AnalysisResult(BaseModel):
     """
     The output of an AI analysis session.
     """
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    model_config = ConfigDict(extra="ignore")
+
+    timestamp: datetime = Field(default_factory=_utcnow)
     issues: List[Issue] = []
     summary: str
+    failed: bool = False  # The analysis did not complete (LLM or parsing error)
     
 class AuditLogEntry(BaseModel):
     """
     Immutable audit log entry for an AI action.
     """
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    model_config = ConfigDict(extra="ignore")
+
+    timestamp: datetime = Field(default_factory=_utcnow)
     user_id: str
     action: str
     details: Dict[str, Any]
@@ -1,14 +1,24 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel
-import json
+from pydantic import BaseModel, ConfigDict, Field
+import orjson
 import os
+import asyncio
+import aiofiles
 import yaml
 import shutil
 import zipfile
 import io
-from fastapi.responses import StreamingResponse
+import queue
+import posixpath
+import tempfile
+from collections import deque
+import time
+import datetime
+import secrets
+from fastapi.responses import Response, StreamingResponse, ORJSONResponse
 from fastapi import UploadFile, File
 
 # Domain
@@ -21,9 +31,10 @@ from app.adapters.k8s_adapter import KubernetesAdapter
 from app.adapters.llm_adapter import LangChainAdapter
 from app.adapters.simulation_adapter import VClusterAdapter
 from app.services.workflow_service import FixWorkflowService
-from app.services.scan_service import ScanService
+from app.services.scan_service import ScanService, DEFAULT_LLM_CONCURRENCY, DEFAULT_SCAN_CHUNK_SIZE
+from app.services.llm_guard import call_llm_with_retry, is_rate_limited
 
-app = FastAPI(title="Kortex API", version="0.1.0")
+app = FastAPI(title="Kortex API", version="0.1.0", default_response_class=ORJSONResponse)
 
 # CORS
 app.add_middleware(
@@ -34,63 +45,163 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Resource listings, history and scan status are large, repetitive JSON
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+HISTORY_LIMIT = 100
+
 # Dependency Injection / State
 # In a real app we'd use a dependency injector framework or `Depends` with a singleton
 class AppState:
-    k8s_adapter: ClusterProviderPort = KubernetesAdapter() # Default generic
     llm_adapter: LLMProviderPort = None # Initialized after loading settings
     sim_adapter = VClusterAdapter()
     active_connections: dict[str, ClusterProviderPort] = {}
     settings: dict = {}
     workflow_service: FixWorkflowService = None
     scan_service: ScanService = None
-    history: List[dict] = []
+    history: deque = deque(maxlen=HISTORY_LIMIT) # Newest first
+    # Lookup indexes over history (same entry objects, newest first)
+    history_by_cluster: Dict[str, deque] = {}
+    history_by_workflow: Dict[str, dict] = {}
+    # cluster_id -> (fetched_at, resources, resources by unique_id, JSON body or None)
+    resource_cache: Dict[str, tuple] = {}
     
 state = AppState()
 HISTORY_FILE = "data/history.json"
 
-def _load_history():
-    if os.path.exists(HISTORY_FILE):
-        try:
-            with open(HISTORY_FILE, "r") as f:
-                return json.load(f)
-        except: return []
-    return []
+# JSON file helpers. Endpoints use the async versions so disk I/O never blocks
+# the event loop; the sync reader is only for bootstrapping at import time.
+def _read_json_sync(path: str, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "rb") as f:
+        return orjson.loads(f.read())
+
+# Raw file contents keyed by path, valid while the file's (mtime, size) is
+# unchanged. These files are read on most requests but rarely written. Every
+# read parses a fresh copy, so callers may mutate what they get back.
+_json_cache: Dict[str, tuple] = {}
+_json_cache_lock = asyncio.Lock()
+
+def _file_version(path: str):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+async def _read_json(path: str, default):
+    version = _file_version(path)
+    if version is None:
+        return default
+    cached = _json_cache.get(path)
+    if cached and cached[0] == version:
+        return orjson.loads(cached[1])
+
+    async with _json_cache_lock:
+        # Another request may have reread it while we waited
+        cached = _json_cache.get(path)
+        if cached and cached[0] == version:
+            return orjson.loads(cached[1])
+        async with aiofiles.open(path, "rb") as f:
+            raw = await f.read()
+        data = orjson.loads(raw)
+        _json_cache[path] = (version, raw)
+        return data
+
+async def _write_json(path: str, data, durable: bool = True):
+    # Serialize before the first await so the snapshot is consistent
+    payload = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    # Write a temp file and rename it over the old one, so a concurrent reader
+    # never sees a half-written file. mkstemp gives every writer its own temp file.
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        async with aiofiles.open(tmp, "wb") as f:
+            await f.write(payload)
+            await f.flush()
+            if durable:
+                await asyncio.to_thread(os.fsync, f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    _json_cache[path] = (_file_version(path), payload)
+
+# Held around load-modify-write of a JSON file so concurrent requests can't
+# lose each other's updates
+_file_locks: Dict[str, asyncio.Lock] = {}
+
+def _file_lock(path: str) -> asyncio.Lock:
+    return _file_locks.setdefault(path, asyncio.Lock())
+
+_history_lock = _file_lock(HISTORY_FILE)
+
+async def _load_history():
+    try:
+        return await _read_json(HISTORY_FILE, [])
+    except: return []
 
-def _save_history():
+async def _save_history():
     try:
         if not os.path.exists("data"): os.mkdir("data")
-        with open(HISTORY_FILE, "w") as f:
-            json.dump(state.history, f, indent=2)
+        async with _history_lock:
+            # History is a convenience log, not worth an fsync per event
+            await _write_json(HISTORY_FILE, list(state.history), durable=False)
     except: pass
 
-state.history = _load_history()
+def _reindex_history():
+    state.history_by_cluster = {}
+    state.history_by_workflow = {}
+    for h in state.history:
+        state.history_by_cluster.setdefault(h.get("cluster_id"), deque()).append(h)
+        if h.get("workflow_id"):
+            state.history_by_workflow.setdefault(h["workflow_id"], h)
+
+try:
+    state.history = deque(_read_json_sync(HISTORY_FILE, []), maxlen=HISTORY_LIMIT)
+except: state.history = deque(maxlen=HISTORY_LIMIT)
+_reindex_history()
+
+_now = datetime.datetime.now
+_token = secrets.token_hex
 
-def add_history(cluster_id: str, action: str, details: str, logs: List[str] = None, workflow_id: str = None):
-    import datetime
+async def add_history(cluster_id: str, action: str, details: str, logs: List[str] = None, workflow_id: str = None):
     entry = {
-        "id": os.urandom(4).hex(),
-        "timestamp": datetime.datetime.now().isoformat(),
+        "id": _token(4),
+        "timestamp": _now().isoformat(),
         "cluster_id": cluster_id,
         "action": action,
         "details": details,
         "logs": logs or [],
         "workflow_id": workflow_id
     }
-    state.history.insert(0, entry) # Prepend
-    if len(state.history) > 100:
-        state.history.pop()
-    _save_history()
+    if len(state.history) == HISTORY_LIMIT:
+        # appendleft is about to drop the oldest entry; drop it from the indexes too.
+        # The oldest entry overall is also the oldest of its cluster.
+        dropped = state.history[-1]
+        cluster_entries = state.history_by_cluster.get(dropped.get("cluster_id"))
+        if cluster_entries and cluster_entries[-1] is dropped:
+            cluster_entries.pop()
+        if state.history_by_workflow.get(dropped.get("workflow_id")) is dropped:
+            del state.history_by_workflow[dropped["workflow_id"]]
+    state.history.appendleft(entry) # Prepend
+    state.history_by_cluster.setdefault(cluster_id, deque()).appendleft(entry)
+    if workflow_id:
+        state.history_by_workflow[workflow_id] = entry
+    await _save_history()
     return entry["id"]
 
-def on_workflow_complete(workflow_id: str, workflow_state: Dict[str, Any]):
+async def on_workflow_complete(workflow_id: str, workflow_state: Dict[str, Any]):
+    # A fix may have changed the cluster
+    state.resource_cache.pop(workflow_state.get("cluster_id"), None)
+
     # Sync logs from workflow to history
-    for h in state.history:
-        if h.get("workflow_id") == workflow_id:
-            h["logs"] = workflow_state.get("logs", [])
-            h["action"] = "FIX_COMPLETED" if workflow_state.get("status") == "completed" else "FIX_FAILED"
-            _save_history()
-            break
+    h = state.history_by_workflow.get(workflow_id)
+    if h is not None:
+        h["logs"] = list(workflow_state.get("logs", []))
+        h["action"] = "FIX_COMPLETED" if workflow_state.get("status") == "completed" else "FIX_FAILED"
+        await _save_history()
 
 # Routes
 @app.get("/health")
@@ -100,41 +211,41 @@ def health_check():
 # Persistence
 CLUSTERS_FILE = "saved_clusters.json"
 
-def _load_saved_clusters() -> List[dict]:
-    if not os.path.exists(CLUSTERS_FILE):
-        return []
-    with open(CLUSTERS_FILE, "r") as f:
-        return json.load(f)
-
-def _save_cluster_entry(entry: dict):
-    clusters = _load_saved_clusters()
-    # Check duplicates
-    if any(c["id"] == entry["id"] for c in clusters):
-        return # Already exists
-    clusters.append(entry)
-    with open(CLUSTERS_FILE, "w") as f:
-        json.dump(clusters, f, indent=2)
+async def _load_saved_clusters() -> List[dict]:
+    return await _read_json(CLUSTERS_FILE, [])
+
+def _saved_cluster_ids(clusters: List[dict]) -> set:
+    return {c["id"] for c in clusters}
+
+async def _write_clusters(clusters: List[dict]):
+    await _write_json(CLUSTERS_FILE, clusters)
+
+async def _save_cluster_entry(entry: dict):
+    async with _file_lock(CLUSTERS_FILE):
+        clusters = await _load_saved_clusters()
+        # Check duplicates
+        if entry["id"] in _saved_cluster_ids(clusters):
+            return # Already exists
+        await _write_clusters(clusters + [entry])
 
 # Settings Persistence
 SETTINGS_FILE = "settings.json"
+DEFAULT_SETTINGS = {
+    "ai_provider": "ollama", 
+    "model_name": "llama3", 
+    "openai_api_key": "",
+    "ignored_namespaces": ["kube-system", "kube-public", "monitoring"] # Safe defaults
+}
+
+async def _load_settings() -> dict:
+    return await _read_json(SETTINGS_FILE, dict(DEFAULT_SETTINGS))
 
-def _load_settings() -> dict:
-    if not os.path.exists(SETTINGS_FILE):
-        return {
-            "ai_provider": "ollama", 
-            "model_name": "llama3", 
-            "openai_api_key": "",
-            "ignored_namespaces": ["kube-system", "kube-public", "monitoring"] # Safe defaults
-        }
-    with open(SETTINGS_FILE, "r") as f:
-        return json.load(f)
-
-def _save_settings(settings: dict):
-    with open(SETTINGS_FILE, "w") as f:
-        json.dump(settings, f, indent=2)
+async def _save_settings(settings: dict):
+    async with _file_lock(SETTINGS_FILE):
+        await _write_json(SETTINGS_FILE, settings)
 
 # Initialize Settings & LLM
-state.settings = _load_settings()
+state.settings = _read_json_sync(SETTINGS_FILE, dict(DEFAULT_SETTINGS))
 if state.settings.get("ai_provider") == "openai" and state.settings.get("openai_api_key"):
     os.environ["OPENAI_API_KEY"] = state.settings["openai_api_key"]
 
@@ -156,43 +267,60 @@ state.scan_service = ScanService(
     llm_adapter=state.llm_adapter
 )
 
+def _sync_services():
+    # Services read these on every run; push them whenever settings or the
+    # LLM adapter change so request handlers never have to
+    state.workflow_service.llm_adapter = state.llm_adapter
+    state.scan_service.llm_adapter = state.llm_adapter
+    state.scan_service.settings = state.settings
+
+_sync_services()
+
+# Request bodies are read-only once parsed
+REQUEST_MODEL_CONFIG = ConfigDict(extra="ignore", frozen=True)
+
 class TestConnectionRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
     kubeconfig_path: Optional[str] = None
-    kubeconfig_content: Optional[dict] = None # For remote/pasted
+    kubeconfig_content: Optional[Dict[str, Any]] = None # For remote/pasted
 
 class SaveClusterRequest(TestConnectionRequest):
     name: str
 
 class SettingsRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
     ai_provider: str
     model_name: str
     openai_api_key: Optional[str] = None
     dependency_level: int = 1
     ignored_namespaces: List[str] = []
+    verbose_logging: bool = False # Per-resource scan log lines
+    llm_concurrency: int = Field(DEFAULT_LLM_CONCURRENCY, ge=1) # Parallel LLM calls per scan
+    scan_chunk_size: int = Field(DEFAULT_SCAN_CHUNK_SIZE, ge=1) # Max resources per LLM call
 
 class ResourceAnalysisRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
     resource_id: str
 
 class StartFixRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
     resource_id: str
     issue_description: str
 
 @app.get("/clusters")
-def get_clusters():
+async def get_clusters():
     """List all saved clusters."""
-    return _load_saved_clusters()
+    return await _load_saved_clusters()
 
 @app.delete("/clusters/{cluster_id}")
-def delete_cluster(cluster_id: str):
+async def delete_cluster(cluster_id: str):
     """Remove a saved cluster."""
-    clusters = _load_saved_clusters()
-    new_clusters = [c for c in clusters if c["id"] != cluster_id]
-    
-    if len(new_clusters) == len(clusters):
-        raise HTTPException(status_code=404, detail="Cluster not found")
-        
-    with open(CLUSTERS_FILE, "w") as f:
-        json.dump(new_clusters, f, indent=2)
+    async with _file_lock(CLUSTERS_FILE):
+        clusters = await _load_saved_clusters()
+        if cluster_id not in _saved_cluster_ids(clusters):
+            raise HTTPException(status_code=404, detail="Cluster not found")
+
+        await _write_clusters([c for c in clusters if c["id"] != cluster_id])
         
     return {"status": "deleted", "id": cluster_id}
 
@@ -213,18 +341,19 @@ def test_connection(req: TestConnectionRequest):
     raise HTTPException(status_code=400, detail="Could not connect to cluster API")
 
 @app.post("/clusters/save")
-def save_cluster(req: SaveClusterRequest):
+async def save_cluster(req: SaveClusterRequest):
     """Test and then save the cluster configuration."""
-    # 1. Test first
+    # 1. Test first (the kubernetes client blocks, keep it off the event loop)
     try:
-        adapter = KubernetesAdapter(
+        adapter = await asyncio.to_thread(
+            KubernetesAdapter,
             kubeconfig_path=req.kubeconfig_path, 
             kubeconfig_content=req.kubeconfig_content
         )
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid config: {str(e)}")
 
-    if not adapter.check_connection():
+    if not await asyncio.to_thread(adapter.check_connection):
             raise HTTPException(status_code=400, detail="Connection test failed")
 
     # 2. Save
@@ -236,67 +365,96 @@ def save_cluster(req: SaveClusterRequest):
         "kubeconfig_path": req.kubeconfig_path,
         "kubeconfig_content": req.kubeconfig_content # In real app, encrypt this!
     }
-    _save_cluster_entry(entry)
+    await _save_cluster_entry(entry)
     return {"id": cluster_id, "status": "saved"}
 
+async def _connect_cluster(cluster: dict) -> Optional[ClusterProviderPort]:
+    # Builds the adapter for a saved cluster and registers it if the API answers
+    adapter = await asyncio.to_thread(
+        KubernetesAdapter,
+        kubeconfig_path=cluster.get("kubeconfig_path"),
+        kubeconfig_content=cluster.get("kubeconfig_content")
+    )
+    if not await asyncio.to_thread(adapter.check_connection):
+        return None
+    state.active_connections[cluster["id"]] = adapter
+    state.resource_cache.pop(cluster["id"], None)
+    return adapter
+
 @app.post("/clusters/{cluster_id}/connect")
-def connect_saved_cluster(cluster_id: str):
+async def connect_saved_cluster(cluster_id: str):
     """Activate a saved cluster session."""
-    clusters = _load_saved_clusters()
+    clusters = await _load_saved_clusters()
     cluster = next((c for c in clusters if c["id"] == cluster_id), None)
     
     if not cluster:
         raise HTTPException(status_code=404, detail="Cluster not found")
         
-    adapter = KubernetesAdapter(
-        kubeconfig_path=cluster.get("kubeconfig_path"),
-        kubeconfig_content=cluster.get("kubeconfig_content")
-    )
-    
-    if not adapter.check_connection():
+    if not await _connect_cluster(cluster):
         raise HTTPException(status_code=500, detail="Cluster is unreachable")
         
-    state.active_connections[cluster_id] = adapter
     return {"id": cluster_id, "status": "connected", "name": cluster["name"]}
 
-@app.get("/clusters/{cluster_id}/resources")
-def list_resources(cluster_id: str):
+async def get_active_adapter(cluster_id: str) -> ClusterProviderPort:
+    # async so FastAPI resolves it inline instead of dispatching to the threadpool
     adapter = state.active_connections.get(cluster_id)
-    if not adapter:
+    if adapter is None:
         raise HTTPException(status_code=404, detail="Cluster not found")
-    
-    resources = adapter.list_resources()
-    # Serialize for frontend
-    return resources
+    return adapter
+
+RESOURCE_CACHE_TTL = 5.0
+
+async def _get_resources(cluster_id: str, adapter: ClusterProviderPort, ttl: float = RESOURCE_CACHE_TTL):
+    # UI flows (analyze -> analyze-resource -> fix) list the same cluster several
+    # times within seconds; reuse one listing for a short window.
+    cached = state.resource_cache.get(cluster_id)
+    if cached and time.monotonic() - cached[0] < ttl:
+        return cached[1], cached[2]
+    resources = await asyncio.to_thread(adapter.list_resources)
+    by_unique_id = {r.unique_id: r for r in resources}
+    state.resource_cache[cluster_id] = (time.monotonic(), resources, by_unique_id, None)
+    return resources, by_unique_id
+
+@app.get("/clusters/{cluster_id}/resources")
+async def list_resources(cluster_id: str, adapter: ClusterProviderPort = Depends(get_active_adapter)):
+    await _get_resources(cluster_id, adapter)
+    fetched_at, resources, by_unique_id, body = state.resource_cache[cluster_id]
+    if body is None:
+        # Serialize for frontend once per listing; polls within the TTL reuse the bytes
+        body = orjson.dumps([r.model_dump() for r in resources])
+        state.resource_cache[cluster_id] = (fetched_at, resources, by_unique_id, body)
+    return Response(content=body, media_type="application/json")
+
+async def _call_llm(fn, *args):
+    # The adapter re-raises throttling errors so they can be retried; once the
+    # retries run out, report them to the client as a 429 instead of a 500
+    try:
+        return await call_llm_with_retry(fn, *args)
+    except Exception as e:
+        if is_rate_limited(e):
+            raise HTTPException(status_code=429, detail=f"LLM provider is rate limiting requests: {e}")
+        raise
 
 @app.post("/clusters/{cluster_id}/analyze")
-async def analyze_cluster(cluster_id: str):
-    adapter = state.active_connections.get(cluster_id)
-    if not adapter:
-        raise HTTPException(status_code=404, detail="Cluster not found")
-        
-    resources = adapter.list_resources() # Get everything
+async def analyze_cluster(cluster_id: str, adapter: ClusterProviderPort = Depends(get_active_adapter)):
+    resources, _ = await _get_resources(cluster_id, adapter) # Get everything
     # Analyze logic
-    result = await state.llm_adapter.analyze_context(resources, "Identify top 3 security risks.")
+    result = await _call_llm(state.llm_adapter.analyze_context, resources, "Identify top 3 security risks.")
     return result
 
 @app.post("/clusters/{cluster_id}/analyze-resource")
-async def analyze_specific_resource(cluster_id: str, req: ResourceAnalysisRequest):
-    adapter = state.active_connections.get(cluster_id)
-    if not adapter:
-        raise HTTPException(status_code=404, detail="Cluster not found")
-        
-    resources = adapter.list_resources() 
+async def analyze_specific_resource(cluster_id: str, req: ResourceAnalysisRequest, adapter: ClusterProviderPort = Depends(get_active_adapter)):
+    resources, by_unique_id = await _get_resources(cluster_id, adapter)
     
-    target = next((r for r in resources if r.unique_id == req.resource_id), None)
+    target = by_unique_id.get(req.resource_id)
     
     if not target:
         raise HTTPException(status_code=404, detail=f"Resource {req.resource_id} not found in cluster")
 
     # Analyze
-    result = await state.llm_adapter.analyze_resource(target, resources)
+    result = await _call_llm(state.llm_adapter.analyze_resource, target, resources)
     
-    add_history(cluster_id, "ANALYSIS", f"Analyzed {target.kind}/{target.name}. Found {len(result.issues)} issues.")
+    await add_history(cluster_id, "ANALYSIS", f"Analyzed {target.kind}/{target.name}. Found {len(result.issues)} issues.")
     
     return result
 
@@ -304,20 +462,17 @@ async def analyze_specific_resource(cluster_id: str, req: ResourceAnalysisReques
 async def start_fix(cluster_id: str, req: StartFixRequest):
     if not state.llm_adapter:
         raise HTTPException(status_code=400, detail="LLM not configured")
-        
-    # Ensure workflow service has latest LLM
-    state.workflow_service.llm_adapter = state.llm_adapter
     
     wf_id = await state.workflow_service.start_fix_workflow(cluster_id, req.resource_id, req.issue_description)
     
-    add_history(cluster_id, "FIX_STARTED", f"Started remediation for {req.resource_id}", logs=[], workflow_id=wf_id)
+    await add_history(cluster_id, "FIX_STARTED", f"Started remediation for {req.resource_id}", logs=[], workflow_id=wf_id)
     
     return {"workflow_id": wf_id}
 
 @app.post("/clusters/{cluster_id}/history")
-def add_custom_history(cluster_id: str, req: Dict[str, Any]):
+async def add_custom_history(cluster_id: str, req: Dict[str, Any]):
     # Allow frontend to push history (e.g. batch fix completion)
-    h_id = add_history(
+    h_id = await add_history(
         cluster_id, 
         req.get("action", "ACTIVITY"), 
         req.get("details", ""), 
@@ -326,11 +481,7 @@ def add_custom_history(cluster_id: str, req: Dict[str, Any]):
     return {"id": h_id}
 
 @app.get("/clusters/{cluster_id}/managed-resources")
-def get_managed_resources(cluster_id: str):
-    adapter = state.active_connections.get(cluster_id)
-    if not adapter:
-        raise HTTPException(status_code=404, detail="Cluster not found")
-    
+def get_managed_resources(adapter: ClusterProviderPort = Depends(get_active_adapter)):
     managed = adapter.get_managed_resources()
     return {
         "count": len(managed),
@@ -338,18 +489,17 @@ def get_managed_resources(cluster_id: str):
     }
 
 @app.post("/clusters/{cluster_id}/cleanup")
-async def cleanup_managed_resources(cluster_id: str):
-    adapter = state.active_connections.get(cluster_id)
-    if not adapter:
-        raise HTTPException(status_code=404, detail="Cluster not found")
-    
-    managed = adapter.get_managed_resources()
-    count = 0
-    for r in managed:
-        if adapter.delete_resource(r.kind, r.name, r.namespace):
-            count += 1
+async def cleanup_managed_resources(cluster_id: str, adapter: ClusterProviderPort = Depends(get_active_adapter)):
+    managed = await asyncio.to_thread(adapter.get_managed_resources)
+    # Each delete is a blocking round-trip; run them side by side off the event loop
+    deleted = await asyncio.gather(*[
+        asyncio.to_thread(adapter.delete_resource, r.kind, r.name, r.namespace)
+        for r in managed
+    ])
+    count = sum(1 for ok in deleted if ok)
+    state.resource_cache.pop(cluster_id, None)
             
-    add_history(cluster_id, "CLEANUP", f"Cleaned up {count} resources created by Kortex.")
+    await add_history(cluster_id, "CLEANUP", f"Cleaned up {count} resources created by Kortex.")
     return {"status": "ok", "cleaned_count": count}
 
 @app.get("/fix/{workflow_id}")
@@ -361,36 +511,45 @@ def get_fix_status(workflow_id: str):
 
 @app.get("/clusters/{cluster_id}/history")
 def get_cluster_history(cluster_id: str):
-    return [h for h in state.history if h["cluster_id"] == cluster_id]
+    return list(state.history_by_cluster.get(cluster_id, ()))
 
 @app.get("/settings")
-def get_settings():
-    return _load_settings()
+async def get_settings():
+    return await _load_settings()
 
 @app.post("/settings")
-def update_settings(req: SettingsRequest):
-    settings = req.dict()
-    _save_settings(settings)
-    
-    # Update State
-    state.settings = settings
+async def update_settings(req: SettingsRequest):
+    settings = req.model_dump()
     if settings.get("ai_provider") == "openai" and settings.get("openai_api_key"):
         os.environ["OPENAI_API_KEY"] = settings["openai_api_key"]
         
-    # Re-init Adapter
+    # Build the new adapter first, so a provider that fails to initialize
+    # leaves the saved settings, the adapter and the services untouched
     try:
-        state.llm_adapter = LangChainAdapter(
+        adapter = LangChainAdapter(
             provider=settings["ai_provider"],
             model_name=settings["model_name"]
         )
-        state.workflow_service.llm_adapter = state.llm_adapter
     except Exception as e:
         print(f"Failed to re-init LLM adapter: {e}")
         raise HTTPException(status_code=400, detail=f"Failed to initialize LLM provider: {str(e)}")
+
+    await _save_settings(settings)
+
+    # Update State
+    previous = state.llm_adapter
+    state.settings = settings
+    state.llm_adapter = adapter
+    _sync_services()
+
+    # Release the old adapter's HTTP connection pool
+    if previous is not None and previous is not adapter:
+        await previous.aclose()
     
     return {"status": "updated"}
 
 class StartScanRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
     scan_type: str = "full" # full, smart
     filters: Optional[List[str]] = None
 
@@ -399,18 +558,12 @@ async def start_cluster_scan(cluster_id: str, req: StartScanRequest = StartScanR
     # Auto-connect if not active but valid
     if not state.active_connections.get(cluster_id):
         # Try to reactivate from saved
-        clusters = _load_saved_clusters()
+        clusters = await _load_saved_clusters()
         cluster = next((c for c in clusters if c["id"] == cluster_id), None)
         if cluster:
             print(f"Auto-connecting cluster {cluster_id} for scan...")
             try:
-                adapter = KubernetesAdapter(
-                    kubeconfig_path=cluster.get("kubeconfig_path"),
-                    kubeconfig_content=cluster.get("kubeconfig_content")
-                )
-                if adapter.check_connection():
-                    state.active_connections[cluster_id] = adapter
-                else:
+                if not await _connect_cluster(cluster):
                     raise Exception("Check failed")
             except Exception as e:
                 print(f"Auto-connect failed: {e}")
@@ -418,22 +571,32 @@ async def start_cluster_scan(cluster_id: str, req: StartScanRequest = StartScanR
         else:
              raise HTTPException(status_code=404, detail="Cluster not found")
     
-    # Ensure scan service has latest LLM if settings changed
-    state.scan_service.llm_adapter = state.llm_adapter
-    state.scan_service.settings = state.settings
-    
     scan_id = await state.scan_service.start_global_scan(cluster_id, req.scan_type, req.filters)
     return {"scan_id": scan_id, "status": "initializing"}
 
 @app.get("/scan/{scan_id}")
-def get_scan_status(scan_id: str):
+async def get_scan_status(scan_id: str):
     status = state.scan_service.get_scan_status(scan_id)
     if not status:
         raise HTTPException(status_code=404, detail="Scan session not found")
     return status
 
+@app.get("/scan/{scan_id}/resources")
+async def get_scan_resources(scan_id: str):
+    resources = state.scan_service.get_scan_resources(scan_id)
+    if resources is None:
+        raise HTTPException(status_code=404, detail="Scan session not found")
+    return resources
+
+@app.get("/scan/{scan_id}/summary")
+async def get_scan_summary(scan_id: str):
+    summary = state.scan_service.get_scan_summary(scan_id)
+    if not summary:
+        raise HTTPException(status_code=404, detail="Scan session not found")
+    return summary
+
 @app.get("/scans")
-def list_scans():
+async def list_scans():
     return state.scan_service.list_scans()
 
 @app.post("/scan/{scan_id}/stop")
@@ -442,63 +605,178 @@ async def stop_scan(scan_id: str):
     return {"status": "stopping"}
 
 @app.post("/scan/cache/clear")
-def clear_scan_cache():
+async def clear_scan_cache():
+    # The scan endpoints are async so the store is only touched on the event
+    # loop, where the background flusher snapshots it
     state.scan_service.clear_cache()
     return {"status": "ok", "message": "Scan cache cleared"}
 
+# Archive export streams the zip while it is being compressed instead of
+# building it in memory first
+ARCHIVE_CHUNK_SIZE = 64 * 1024
+ARCHIVE_QUEUE_CHUNKS = 8
+# Never archived or restored: the LLM response cache's live SQLite files
+# (older installs kept it under data/)
+ARCHIVE_EXCLUDED_PREFIXES = ("data/llm_cache/",)
+
+def _is_archived_path(name: str) -> bool:
+    return not name.replace(os.sep, "/").startswith(ARCHIVE_EXCLUDED_PREFIXES)
+
+class _ZipStreamWriter(io.RawIOBase):
+    """
+    Unseekable sink for ZipFile running in a worker thread. Output is handed to
+    the response in ARCHIVE_CHUNK_SIZE pieces through a bounded queue, so a
+    slow client throttles compression instead of letting it buffer up.
+    """
+    def __init__(self):
+        self.chunks: queue.Queue = queue.Queue(maxsize=ARCHIVE_QUEUE_CHUNKS)
+        self.aborted = False # Set when the client goes away
+        self._buf = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._buf += b
+        if len(self._buf) >= ARCHIVE_CHUNK_SIZE:
+            self._push(bytes(self._buf))
+            self._buf.clear()
+        return len(b)
+
+    def _push(self, chunk: bytes):
+        while True:
+            if self.aborted:
+                raise OSError("Archive download aborted")
+            try:
+                self.chunks.put(chunk, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def finish(self):
+        if self._buf:
+            self._push(bytes(self._buf))
+            self._buf.clear()
+
+    def end(self):
+        # The end-of-stream marker must always arrive or the reader waits forever.
+        # Wait for room while the client is still reading; once it has gone, a
+        # full queue means nobody is parked on get() and the marker can be dropped.
+        while True:
+            try:
+                self.chunks.put(None, timeout=0.5)
+                return
+            except queue.Full:
+                if self.aborted:
+                    return
+
+def _write_archive(sink: _ZipStreamWriter):
+    try:
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            # Add data directory
+            if os.path.exists("data"):
+                for root, dirs, files in os.walk("data"):
+                    for file in files:
+                        file_path = os.path.join(root, file)
+                        if _is_archived_path(file_path):
+                            zipf.write(file_path, file_path)
+            
+            # Add settings
+            if os.path.exists(SETTINGS_FILE):
+                zipf.write(SETTINGS_FILE, SETTINGS_FILE)
+        sink.finish()
+    finally:
+        sink.end()
+
+async def _archive_chunks():
+    sink = _ZipStreamWriter()
+    producer = asyncio.ensure_future(asyncio.to_thread(_write_archive, sink))
+    try:
+        while True:
+            chunk = await asyncio.to_thread(sink.chunks.get)
+            if chunk is None:
+                break
+            yield chunk
+        await producer # Surface errors from the zip thread
+    finally:
+        sink.aborted = True
+
 @app.get("/archive/export")
 async def export_archive():
     """Export all application data (scans, history, settings) as a zip file."""
-    memory_file = io.BytesIO()
-    with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        # Add data directory
-        if os.path.exists("data"):
-            for root, dirs, files in os.walk("data"):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    zipf.write(file_path, file_path)
-        
-        # Add settings
-        if os.path.exists(SETTINGS_FILE):
-            zipf.write(SETTINGS_FILE, SETTINGS_FILE)
-            
-    memory_file.seek(0)
     return StreamingResponse(
-        memory_file,
+        _archive_chunks(),
         media_type="application/zip",
         headers={"Content-Disposition": "attachment; filename=kortex-archive.zip"}
     )
 
+# Import limits: upload size, and uncompressed size per entry and overall
+# (the zip-bomb guard)
+MAX_ARCHIVE_BYTES = 512 * 1024 * 1024
+ARCHIVE_MAX_FILE_BYTES = 1024 * 1024 * 1024
+ARCHIVE_MAX_TOTAL_BYTES = 2 * 1024 * 1024 * 1024
+ARCHIVE_SPOOL_BYTES = 8 * 1024 * 1024 # Larger uploads spill to a temp file
+
+def _is_safe_archive_path(name: str) -> bool:
+    # Members are already limited to data/ or the settings file, so what is
+    # left to reject is climbing out with ".." (or a Windows separator)
+    return "\\" not in name and ".." not in posixpath.normpath(name).split("/")
+
+def _extract_archive(fileobj):
+    with zipfile.ZipFile(fileobj, 'r') as zipf:
+        # We only extract what's allowed
+        members = [
+            info for info in zipf.infolist()
+            if (info.filename.startswith("data/") and _is_archived_path(info.filename))
+            or info.filename == SETTINGS_FILE
+        ]
+        # Validate everything before writing anything
+        total = 0
+        for info in members:
+            if not _is_safe_archive_path(info.filename):
+                raise HTTPException(status_code=400, detail=f"Unsafe path in archive: {info.filename}")
+            if info.file_size > ARCHIVE_MAX_FILE_BYTES:
+                raise HTTPException(status_code=413, detail=f"Archive entry is too large: {info.filename}")
+            total += info.file_size
+            if total > ARCHIVE_MAX_TOTAL_BYTES:
+                raise HTTPException(status_code=413, detail="Archive contents are too large")
+        for info in members:
+            zipf.extract(info, ".")
+
 @app.post("/archive/import")
 async def import_archive(file: UploadFile = File(...)):
     """Import application data from a zip file, overwriting existing but preserving clusters."""
     try:
-        contents = await file.read()
-        memory_file = io.BytesIO(contents)
-        
-        with zipfile.ZipFile(memory_file, 'r') as zipf:
-            # Validate contents? For now just extract
-            # We only extract what's allowed
-            allowed_files = [SETTINGS_FILE]
-            for f in zipf.namelist():
-                if f.startswith("data/") or f == SETTINGS_FILE:
-                    zipf.extract(f, ".")
+        # Copy the upload in chunks and stop as soon as it exceeds the cap, so
+        # an oversized file is never held in memory
+        size = 0
+        with tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_BYTES) as buf:
+            while chunk := await file.read(ARCHIVE_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_ARCHIVE_BYTES:
+                    raise HTTPException(status_code=413, detail="Archive is too large")
+                buf.write(chunk)
+            buf.seek(0)
+            await asyncio.to_thread(_extract_archive, buf)
         
         # Reload state
         global state
-        state.history = _load_history()
-        state.settings = _load_settings()
-        
-        # Re-sync scan service and others if needed
-        # (Simplified: reload trigger)
+        state.history = deque(await _load_history(), maxlen=HISTORY_LIMIT)
+        _reindex_history()
+        state.settings = await _load_settings()
+        _sync_services()
         
         return {"status": "ok", "message": "Archive imported successfully. Please refresh the page."}
+    except HTTPException:
+        raise
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Import failed: not a zip archive")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
 
 @app.post("/settings/test")
 async def test_settings_connection(req: SettingsRequest):
-    settings = req.dict()
+    settings = req.model_dump()
     
     # Temporarily set env var for OpenAI if needed
     if settings.get("ai_provider") == "openai" and settings.get("openai_api_key"):
@@ -509,11 +787,23 @@ async def test_settings_connection(req: SettingsRequest):
             provider=settings["ai_provider"],
             model_name=settings["model_name"]
         )
-        await adapter.test_connection()
+        try:
+            await adapter.test_connection()
+        finally:
+            await adapter.aclose()
         return {"status": "ok", "message": "Connection successful"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Connection failed: {str(e)}")
 
+@app.on_event("shutdown")
+async def close_llm_adapter():
+    if state.llm_adapter:
+        await state.llm_adapter.aclose()
+
+@app.on_event("shutdown")
+async def flush_scan_store():
+    await state.scan_service.flush()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
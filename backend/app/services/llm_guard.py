@@ -0,0 +1,60 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# Error text that marks a throttled request (OpenAI, Ollama proxies, ...).
+# Anything else is treated as terminal and raised straight away.
+RATE_LIMIT_MARKERS = ("429", "rate limit", "rate_limit", "ratelimit", "too many requests", "quota")
+
+# Process-wide ceiling shared by every scan and workflow: at most
+# LLM_MAX_CONCURRENCY calls in flight, started at least LLM_MIN_INTERVAL apart.
+LLM_MAX_CONCURRENCY = 8
+LLM_MIN_INTERVAL = 0.05
+
+_llm_sem = None
+_llm_sem_loop = None
+_next_call_ts = 0.0
+
+def _llm_semaphore() -> asyncio.Semaphore:
+    # Created lazily against the running loop (tests run several loops)
+    global _llm_sem, _llm_sem_loop
+    loop = asyncio.get_running_loop()
+    if _llm_sem is None or _llm_sem_loop is not loop:
+        _llm_sem = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        _llm_sem_loop = loop
+    return _llm_sem
+
+@asynccontextmanager
+async def llm_slot():
+    global _next_call_ts
+    async with _llm_semaphore():
+        # Reserve the next start time before sleeping so concurrent callers queue up
+        now = time.monotonic()
+        delay = _next_call_ts - now
+        _next_call_ts = max(now, _next_call_ts) + LLM_MIN_INTERVAL
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield
+
+def is_rate_limited(error: Exception) -> bool:
+    if getattr(error, "status_code", None) == 429:
+        return True
+    msg = str(error).lower()
+    return any(marker in msg for marker in RATE_LIMIT_MARKERS)
+
+async def call_llm_with_retry(fn, *args, max_attempts: int = 3, base: float = 1.0, cap: float = 30.0, **kwargs):
+    """Awaits fn(*args, **kwargs), retrying with doubling backoff while the LLM backend throttles."""
+    for attempt in range(max_attempts):
+        try:
+            # Backoff happens outside the slot so a throttled call doesn't hold it
+            async with llm_slot():
+                return await fn(*args, **kwargs)
+        except Exception as e:
+            if attempt + 1 >= max_attempts or not is_rate_limited(e):
+                raise
+            delay = min(cap, base * 2 ** attempt)
+            logger.warning(f"LLM call rate limited ({e}); retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
@@ -4,62 +4,156 @@ import asyncio
 from typing import Dict, List, Any
 from app.ports.interfaces import ClusterProviderPort, LLMProviderPort
 from app.domain.models import AnalysisResult, Issue, Severity, IssueCategory
+from app.services.llm_guard import call_llm_with_retry
 
 logger = logging.getLogger(__name__)
 
 import json
 import os
+import tempfile
+from collections import deque, defaultdict, Counter, OrderedDict
+import msgspec
+import time
 import datetime
 
+_now = datetime.datetime.now
+
+def _clock() -> str:
+    # Log timestamp (HH:MM:SS); formatting the fields directly is much cheaper than strftime
+    t = _now()
+    return f"{t.hour:02d}:{t.minute:02d}:{t.second:02d}"
+
 # In-memory store for scan states
 # { "scan_id": { "id": str, "cluster_id": str, "status": str, "progress": int, "logs": [], "results": AnalysisResult, "current_step": str } }
 scan_store = {}
-SCANS_FILE = "data/scans.json"
-SNAPSHOTS_FILE = "data/snapshots.json"
+# Persisted as msgpack; the .json files are what older versions wrote and are
+# only read when migrating (or written as a readable mirror with KORTEX_DEBUG_JSON)
+SCANS_FILE = "data/scans.mpk"
+SNAPSHOTS_FILE = "data/snapshots.mpk"
+LEGACY_SCANS_FILE = "data/scans.json"
+LEGACY_SNAPSHOTS_FILE = "data/snapshots.json"
+DEBUG_JSON = bool(os.environ.get("KORTEX_DEBUG_JSON"))
+# Saves requested within this window are coalesced into one write
+FLUSH_INTERVAL = 0.5
+# Log lines kept per scan
+MAX_SCAN_LOGS = 1000
+# Per-scan keys that only live in memory
+TRANSIENT_KEYS = ("task", "_summary", "_resources_view")
+# Namespaces analyzed at once per scan unless settings["llm_concurrency"] says otherwise
+DEFAULT_LLM_CONCURRENCY = 5
+# Namespaces larger than this go to the LLM in several calls (settings["scan_chunk_size"]).
+# Resources are sent as compact summaries; 50 of them fit comfortably in an
+# 8k-token context alongside the prompt.
+DEFAULT_SCAN_CHUNK_SIZE = 50
+# Scans whose manifests are kept in memory for the resource graph
+MAX_SCAN_CONTENTS = 5
 
 class ScanService:
     def __init__(self, cluster_registry: Dict[str, ClusterProviderPort], llm_adapter: LLMProviderPort):
         self.cluster_registry = cluster_registry
         self.llm_adapter = llm_adapter
-        self.resource_snapshots = self._load_json(SNAPSHOTS_FILE, {})
+        self._encoder = msgspec.msgpack.Encoder()
+        self._decoder = msgspec.msgpack.Decoder(type=dict)
+        self.resource_snapshots = self._load_store(SNAPSHOTS_FILE, LEGACY_SNAPSHOTS_FILE, {})
         self.settings = {} # Injected by main
+        # scan_id -> {unique_id: content} as fetched by that scan, for the most
+        # recent scans only. Kept out of resources_list so manifests are neither
+        # persisted nor sent with every status poll.
+        self.scan_contents: "OrderedDict[str, Dict[str, dict]]" = OrderedDict()
+        # Background saver, started on the first save inside the event loop
+        self._dirty: asyncio.Event = None
+        self._flusher_task: asyncio.Task = None
         self._load_scans()
 
-    def _load_json(self, path, default):
-        if os.path.exists(path):
-            try:
-                with open(path, "r") as f:
+    def _load_store(self, path, legacy_path, default):
+        try:
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    return self._decoder.decode(f.read())
+            if os.path.exists(legacy_path):
+                # First start after upgrading; the next save writes msgpack
+                with open(legacy_path, "r") as f:
                     return json.load(f)
-            except:
-                return default
+        except Exception as e:
+            logger.error(f"Failed to load {path}: {e}")
         return default
 
-    def _save_json(self, path, data):
+    def _save_store(self, path, legacy_path, data):
         try:
-            with open(path, "w") as f:
-                json.dump(data, f, indent=2)
+            # Write a temp file and rename it over the old one so a crash
+            # mid-write never leaves a truncated store behind. The name is unique
+            # per save, so overlapping saves never write into the same file.
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(self._encoder.encode(data))
+                os.replace(tmp, path)
+            except BaseException:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+                raise
+            if DEBUG_JSON:
+                with open(legacy_path, "w") as f:
+                    json.dump(data, f, indent=2)
         except Exception as e:
             logger.error(f"Failed to save {path}: {e}")
 
     def _load_scans(self):
         global scan_store
-        scan_store = self._load_json(SCANS_FILE, {})
+        scan_store = self._load_store(SCANS_FILE, LEGACY_SCANS_FILE, {})
         # Reset any stuck 'analyzing' or 'initializing' scans on restart
         for sId, data in scan_store.items():
+            data["logs"] = deque(data.get("logs", []), maxlen=MAX_SCAN_LOGS)
             if data["status"] in ["analyzing", "initializing", "fetching_resources"]:
                 data["status"] = "failed"
                 data["logs"].append({
-                    "timestamp": datetime.datetime.now().strftime("%H:%M:%S"),
+                    "timestamp": _clock(),
                     "message": "Scan interrupted by system restart."
                 })
 
     def _save_scans(self):
+        # Marks the store dirty; the flusher writes it at most every FLUSH_INTERVAL
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_store(*self._snapshot_store())
+            return
+        if self._flusher_task is None or self._flusher_task.done():
+            self._dirty = asyncio.Event()
+            self._flusher_task = asyncio.create_task(self._flusher())
+        self._dirty.set()
+
+    async def _flusher(self):
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            await self._flush_now()
+            await asyncio.sleep(FLUSH_INTERVAL)
+
+    async def flush(self):
+        """Writes any pending changes now (called on shutdown)."""
+        if self._dirty is not None and self._dirty.is_set():
+            self._dirty.clear()
+            await self._flush_now()
+
+    async def _flush_now(self):
+        # Take the shallow copies on the loop so scans can't change the dicts
+        # mid-iteration; encoding and disk I/O happen in a worker thread
+        await asyncio.to_thread(self._write_store, *self._snapshot_store())
+
+    def _snapshot_store(self):
         # Exclude 'task' key which is not serializable
         clean_store = {}
         for sId, data in scan_store.items():
-            clean_store[sId] = {k: v for k, v in data.items() if k != "task"}
-        self._save_json(SCANS_FILE, clean_store)
-        self._save_json(SNAPSHOTS_FILE, self.resource_snapshots)
+            clean_store[sId] = {k: v for k, v in data.items() if k not in TRANSIENT_KEYS}
+            clean_store[sId]["logs"] = list(data["logs"])
+        return clean_store, dict(self.resource_snapshots)
+
+    def _write_store(self, clean_store, snapshots):
+        self._save_store(SCANS_FILE, LEGACY_SCANS_FILE, clean_store)
+        self._save_store(SNAPSHOTS_FILE, LEGACY_SNAPSHOTS_FILE, snapshots)
 
     async def start_global_scan(self, cluster_id: str, scan_type: str = "full", filters: List[str] = None) -> str:
         scan_id = str(uuid.uuid4())
@@ -70,16 +164,18 @@ class ScanService:
             "status": "initializing",
             "type": scan_type,
             "filters": filters,
+            "created_at": _now().isoformat(),
             "progress": 0,
-            "logs": [{
-                "timestamp": __import__("datetime").datetime.now().strftime("%H:%M:%S"),
+            "logs": deque([{
+                "timestamp": _clock(),
                 "message": f"Initializing {scan_type} cluster scan..."
-            }],
+            }], maxlen=MAX_SCAN_LOGS),
             "results": {"issues": [], "summary": "", "timestamp": None},
             "total_resources": 0,
             "analyzed_resources": 0,
             "resource_status": {}, # { unique_id: "pending" | "analyzed" | "error" }
             "resources_list": [],  # Lightweight list of resources for frontend graph [ {kind, name, namespace, unique_id} ]
+            "resources_version": 0, # Bumped whenever resources_list is rebuilt
             "task": None  # Store task
         }
         
@@ -107,43 +203,85 @@ class ScanService:
     def get_scan_status(self, scan_id: str) -> Dict[str, Any]:
         data = scan_store.get(scan_id)
         if data:
-            return {k: v for k, v in data.items() if k != "task"}
+            return {k: v for k, v in data.items() if k not in TRANSIENT_KEYS}
+        return None
+
+    def get_scan_resources(self, scan_id: str) -> List[Dict[str, Any]]:
+        """resources_list with each manifest as it was when the scan fetched it."""
+        data = scan_store.get(scan_id)
+        if data is None:
+            return None
+        # Rebuilt only when resources_list is; clients refetch on a new resources_version
+        key = data.get("resources_version", 0)
+        cached = data.get("_resources_view")
+        if cached and cached[0] == key:
+            return cached[1]
+        contents = self.scan_contents.get(scan_id) or {}
+        view = [
+            r if "content" in r else {**r, "content": contents.get(r["unique_id"], {})}
+            for r in data.get("resources_list", [])
+        ]
+        data["_resources_view"] = (key, view)
+        return view
+
+    def get_scan_summary(self, scan_id: str) -> Dict[str, Any]:
+        """The small, frequently polled part of a scan, without logs or resources."""
+        data = scan_store.get(scan_id)
+        if data:
+            return self._summary(scan_id, data)
         return None
 
     def list_scans(self) -> List[Dict[str, Any]]:
         """Returns a list of all scans in the store."""
-        scans = []
-        for sId, data in scan_store.items():
-            scans.append({
-                "id": sId,
-                "cluster_id": data.get("cluster_id"),
-                "status": data.get("status"),
-                "progress": data.get("progress"),
-                "timestamp": data.get("results", {}).get("timestamp") or data.get("logs", [{}])[0].get("timestamp"),
-                "total_issues": len(data.get("results", {}).get("issues", [])),
-                "type": data.get("type", "full")
-            })
-        # Sort by timestamp (newest first)
-        return sorted(scans, key=lambda x: str(x["timestamp"]), reverse=True)
+        # The store keeps scans in creation order (persistence preserves it),
+        # so newest first is just the reverse
+        return [self._summary(sId, scan_store[sId]) for sId in reversed(scan_store)]
+
+    def _summary(self, scan_id, data) -> Dict[str, Any]:
+        # Rebuilt only when one of the fields it depends on has changed, so
+        # dashboards polling every scan stay O(1) per scan
+        results = data.get("results", {})
+        issues = results.get("issues", [])
+        key = (data.get("status"), data.get("progress"), len(issues), results.get("timestamp"))
+        cached = data.get("_summary")
+        if cached and cached[0] == key:
+            return cached[1]
+        summary = {
+            "id": scan_id,
+            "cluster_id": data.get("cluster_id"),
+            "status": data.get("status"),
+            "progress": data.get("progress"),
+            "timestamp": results.get("timestamp") or data.get("created_at") or data.get("logs", [{}])[0].get("timestamp"),
+            "total_issues": len(issues),
+            "type": data.get("type", "full")
+        }
+        data["_summary"] = (key, summary)
+        return summary
 
     def clear_cache(self):
         """Clears all in-memory scan history and resource snapshots."""
         global scan_store
         scan_store.clear()
         self.resource_snapshots.clear()
+        self.scan_contents.clear()
+        self._save_scans()
         logger.info("Scan cache and resource snapshots cleared.")
 
     def _log_message(self, scan_id, msg):
         logger.info(f"SCAN {scan_id}: {msg}")
         if scan_id not in scan_store: return
-        import datetime
         entry = {
-            "timestamp": datetime.datetime.now().strftime("%H:%M:%S"),
+            "timestamp": _clock(),
             "message": msg
         }
-        scan_store[scan_id]["logs"].append(entry)
-        if len(scan_store[scan_id]["logs"]) > 1000:
-            scan_store[scan_id]["logs"] = scan_store[scan_id]["logs"][-1000:]
+        scan_store[scan_id]["logs"].append(entry) # Bounded deque drops the oldest
+
+    async def _call_llm_with_retry(self, ns_resources, prompt, max_attempts=3, base=1.0, cap=30.0):
+        # A throttled backend should not fail the whole namespace
+        return await call_llm_with_retry(
+            self.llm_adapter.analyze_context, ns_resources, prompt,
+            max_attempts=max_attempts, base=base, cap=cap
+        )
 
     async def _run_scan(self, scan_id: str):
         logger.info(f"Running scan task for {scan_id}")
@@ -163,6 +301,9 @@ class ScanService:
             await asyncio.sleep(0.1) # Force yield to ensure status propogates if task started synchronously
             state["status"] = "fetching_resources"
             log("Fetching all cluster resources...")
+            # Persist on status transitions and new issues only; progress and
+            # per-resource status are in-memory (in-flight scans reload as failed)
+            self._save_scans()
             
             try:
                 # Run blocking I/O in thread to avoid freezing loop, with timeout
@@ -171,23 +312,29 @@ class ScanService:
                     timeout=60.0 # 60s timeout for large clusters
                 )
                 log(f"Fetched {len(all_resources)} total resources.")
+                self.scan_contents[scan_id] = {r.unique_id: r.content for r in all_resources}
+                while len(self.scan_contents) > MAX_SCAN_CONTENTS:
+                    self.scan_contents.popitem(last=False)
             except asyncio.TimeoutError:
                 raise Exception("Timed out fetching resources from Kubernetes API")
             
-            # Filter Logic
-            resources_to_scan = []
+            # Filter Logic: a single pass that also groups the queue by namespace
             previous_snapshot = self.resource_snapshots.get(cluster_id, {})
             current_snapshot = {}
-            ignored_namespaces = self.settings.get("ignored_namespaces", [])
+            ignored_namespaces = set(self.settings.get("ignored_namespaces", []))
+            filter_set = set(filters)
+            resources_by_ns = defaultdict(list)
+            resource_counts_by_ns = defaultdict(Counter)
             
             skipped_count = 0
+            queued_count = 0
             
             for r in all_resources:
                 rv = r.content.get("metadata", {}).get("resourceVersion", "0")
                 current_snapshot[r.unique_id] = rv
                 
                 # 1. Apply Kind Filters (If provided, filter both Map and Scan)
-                if filters and r.kind not in filters:
+                if filter_set and r.kind not in filter_set:
                     continue
 
                 # 2. Add to map data
@@ -195,8 +342,7 @@ class ScanService:
                     "kind": r.kind,
                     "name": r.name,
                     "namespace": r.namespace,
-                    "unique_id": r.unique_id,
-                    "content": r.content
+                    "unique_id": r.unique_id
                 })
 
                 # 3. Handle Ignored Namespaces (Map only, no analysis)
@@ -213,95 +359,118 @@ class ScanService:
                 
                 # 5. Queue for AI analysis
                 state["resource_status"][r.unique_id] = "pending"
-                resources_to_scan.append(r)
+                resources_by_ns[r.namespace].append(r)
+                resource_counts_by_ns[r.namespace][r.kind] += 1
+                queued_count += 1
             
             if scan_type == "smart":
-                log(f"Smart Scan: {len(resources_to_scan)}/ {len(all_resources)} resources selected ({skipped_count} skipped).")
+                log(f"Smart Scan: {queued_count}/ {len(all_resources)} resources selected ({skipped_count} skipped).")
             else:
-                log(f"Full Scan: {len(resources_to_scan)} resources queued.")
+                log(f"Full Scan: {queued_count} resources queued.")
 
-            state["total_resources"] = len(resources_to_scan)
+            state["total_resources"] = queued_count
+            state["resources_version"] = state.get("resources_version", 0) + 1
 
-            if not resources_to_scan:
+            if not queued_count:
                 log("No resources to analyze.")
                 state["status"] = "completed"
                 state["progress"] = 100
                 state["results"]["summary"] = "No changes detected or no resources found matching filters."
-                state["results"]["timestamp"] = __import__("datetime").datetime.now().isoformat()
+                state["results"]["timestamp"] = _now().isoformat()
                 self.resource_snapshots[cluster_id] = current_snapshot
+                self._save_scans()
                 return
 
             state["pending_snapshot"] = current_snapshot # Temporarily store to save on success
 
-            issues_found = []
-            
-            resources_by_ns = {}
-            for r in resources_to_scan:
-                if r.namespace not in resources_by_ns:
-                    resources_by_ns[r.namespace] = []
-                resources_by_ns[r.namespace].append(r)
+            # Filled as each namespace finishes, so partial results show up mid-scan
+            issues_found = state["results"]["issues"]
             
             namespaces = list(resources_by_ns.keys())
-            total_ns = len(namespaces)
             
             state["status"] = "analyzing"
+            self._save_scans()
             
             processed_count = 0
-            
-            for i, ns in enumerate(namespaces):
+            sem = asyncio.BoundedSemaphore(max(1, self.settings.get("llm_concurrency", DEFAULT_LLM_CONCURRENCY)))
+
+            chunk_size = max(1, self.settings.get("scan_chunk_size", DEFAULT_SCAN_CHUNK_SIZE))
+            # Oversized namespaces are split so one huge namespace doesn't
+            # serialize the tail of the scan behind a single LLM call
+            work = []
+            for ns in namespaces:
                 ns_resources = resources_by_ns[ns]
+                chunks = [ns_resources[i:i + chunk_size] for i in range(0, len(ns_resources), chunk_size)]
+                work.extend((ns, part, len(chunks), chunk) for part, chunk in enumerate(chunks, 1))
+
+            def log_ns_summary(ns):
+                ns_resources = resources_by_ns[ns]
+                log(f"Analyzing {len(ns_resources)} resources in namespace '{ns}'")
+                if self.settings.get("verbose_logging", False):
+                    # Per-resource lines are opt-in; they add nothing the summary lacks
+                    for r in ns_resources:
+                        log(f"Analyzing {r.kind}/{r.name}...")
                 
-                # Detailed resource logging
-                resource_counts = {}
-                for r in ns_resources:
-                    resource_counts[r.kind] = resource_counts.get(r.kind, 0) + 1
-                    # Verbose log for user visibility
-                    log(f"Analyzing {r.kind}/{r.name}...")
-                
-                summary_str = ", ".join([f"{k}: {v}" for k, v in resource_counts.items()])
+                resource_counts = resource_counts_by_ns[ns]
+                summary_str = ", ".join(f"{k}: {v}" for k, v in resource_counts.items())
                 log(f"Namespace '{ns}' Summary: {summary_str}")
                 log(f"Sending batch to AI for deep inspection of all resources including Deployments, ConfigMaps, Secrets, Services, etc...")
-                
-                try:
-                    import time
-                    t0 = time.time()
-                    
-                    partial_result = await self.llm_adapter.analyze_context(
-                        ns_resources, 
-                        f"Analyze every single provided resource in namespace '{ns}'. Thoroughly inspect Deployments, ConfigMaps, Secrets, Services, and anything else. Detect security risks, misconfigurations, and specific issues for each resource."
-                    )
+
+            async def analyze_chunk(ns, part, parts, chunk):
+                # Chunks are independent LLM calls; up to `sem` of them run at once
+                async with sem:
+                    if part == 1:
+                        log_ns_summary(ns)
+                    else:
+                        log(f"Sending part {part}/{parts} of namespace '{ns}' to AI...")
                     
-                    duration = time.time() - t0
-                    log(f"AI Analysis completed for {ns} in {duration:.1f}s")
+                    t0 = time.time()
+                    try:
+                        partial_result = await self._call_llm_with_retry(
+                            chunk, 
+                            f"Analyze every single provided resource in namespace '{ns}'. Thoroughly inspect Deployments, ConfigMaps, Secrets, Services, and anything else. Detect security risks, misconfigurations, and specific issues for each resource."
+                        )
+                        return ns, part, parts, chunk, partial_result, None, time.time() - t0
+                    except Exception as e:
+                        return ns, part, parts, chunk, None, e, time.time() - t0
+
+            tasks = [asyncio.create_task(analyze_chunk(*w)) for w in work]
+            try:
+                # Shared state is only touched here, as each chunk finishes
+                for next_done in asyncio.as_completed(tasks):
+                    ns, part, parts, ns_resources, partial_result, error, duration = await next_done
+                    label = ns if parts == 1 else f"{ns} (part {part}/{parts})"
                     
-                    if partial_result and partial_result.issues:
-                        log(f"AI detected {len(partial_result.issues)} issues in {ns}:")
-                        for issue in partial_result.issues:
-                            # Enrich issue with resource ID if missing
-                            if not issue.affected_resource_ids:
-                                pass
-                            issues_found.extend(partial_result.issues)
-                            log(f"  - [{issue.severity}] {issue.title}")
+                    if error is None:
+                        log(f"AI Analysis completed for {label} in {duration:.1f}s")
+                        
+                        if partial_result and partial_result.issues:
+                            log(f"AI detected {len(partial_result.issues)} issues in {label}:")
+                            issues_found.extend(i.model_dump() for i in partial_result.issues)
+                            for issue in partial_result.issues:
+                                log(f"  - [{issue.severity}] {issue.title}")
+                            self._save_scans()
+                        else:
+                            log(f"No issues detected in {label}.")
                     else:
-                        log(f"No issues detected in {ns}.")
+                        log(f"Error analyzing namespace {label}: {str(error)}")
+                        for r in ns_resources:
+                             state["resource_status"][r.unique_id] = "error"
                     
-                except Exception as e:
-                    log(f"Error analyzing namespace {ns}: {str(e)}")
+                    # Mark as done
                     for r in ns_resources:
-                         state["resource_status"][r.unique_id] = "error"
-                
-                # Mark as done
-                for r in ns_resources:
-                    if state["resource_status"][r.unique_id] != "error":
-                         state["resource_status"][r.unique_id] = "analyzed"
-
-                processed_count += len(ns_resources)
-                state["analyzed_resources"] = processed_count
-                state["progress"] = int((processed_count / state["total_resources"]) * 100)
-                await asyncio.sleep(0.1) # Yield
+                        if state["resource_status"][r.unique_id] != "error":
+                             state["resource_status"][r.unique_id] = "analyzed"
+
+                    processed_count += len(ns_resources)
+                    state["analyzed_resources"] = processed_count
+                    state["progress"] = int((processed_count / state["total_resources"]) * 100)
+            finally:
+                # Stopping the scan cancels whatever is still queued or in flight
+                for task in tasks:
+                    task.cancel()
             
             # Finalize
-            state["results"]["issues"] = [i.dict() for i in issues_found]
             state["results"]["summary"] = f"Scan complete. Found {len(issues_found)} issues across {state['total_resources']} resources."
             
             log("Analysis passed. Generating final summary...")
@@ -324,5 +493,5 @@ class ScanService:
             import traceback
             state["status"] = "failed"
             log(f"Scan failed: {str(e)}")
-            self._save_scans()
             log(traceback.format_exc())
+            self._save_scans()
@@ -2,9 +2,11 @@ from typing import Dict, Any, List
 import uuid
 import asyncio
 import logging
-from app.domain.models import Cluster, KubernetesResource, RemediationStep, AnalysisResult
+from collections import deque
+from app.domain.models import Cluster, KubernetesResource, RemediationStep, AnalysisResult, Severity
 from app.ports.interfaces import ClusterProviderPort, SimulationEnginePort, LLMProviderPort
 from app.adapters.k8s_adapter import KubernetesAdapter
+from app.services.llm_guard import call_llm_with_retry
 
 # Simple in-memory store for workflows
 # { "workflow_id": { "status": "...", "logs": [], "current_step": "...", "vcluster_id": "...", "target_cluster_id": "..." } }
@@ -12,6 +14,15 @@ workflow_store = {}
 
 logger = logging.getLogger(__name__)
 
+# VCluster readiness probing: attempts, per-probe timeout and backoff ceiling (seconds)
+VCLUSTER_CONNECT_ATTEMPTS = 10
+VCLUSTER_PROBE_TIMEOUT = 5
+VCLUSTER_MAX_BACKOFF = 8
+# Keep only the most recent workflow log lines (tracebacks can be long)
+MAX_WORKFLOW_LOGS = 2000
+# Severity is a str enum, so order it explicitly (declaration order, LOW..CRITICAL)
+SEVERITY_RANK = {sev: rank for rank, sev in enumerate(Severity)}
+
 class FixWorkflowService:
     def __init__(self, 
                  sim_adapter: SimulationEnginePort, 
@@ -31,7 +42,7 @@ class FixWorkflowService:
             "resource_id": resource_id,
             "issue": issue_description,
             "status": "initializing",
-            "logs": ["Workflow initialized. Starting Process..."],
+            "logs": deque(["Workflow initialized. Starting Process..."], maxlen=MAX_WORKFLOW_LOGS),
             "steps": []
         }
         
@@ -81,15 +92,24 @@ class FixWorkflowService:
             log(f"VCluster {shadow_cluster.id} created successfully with isolation.")
             
             # Connect to VCluster
-            vcluster_adapter = KubernetesAdapter(kubeconfig_path=shadow_cluster.kubeconfig_path)
-            # Connectivity check might take a moment if pods are spinning up
-            for i in range(10):
-                if vcluster_adapter.check_connection():
+            vcluster_adapter = await asyncio.to_thread(KubernetesAdapter, kubeconfig_path=shadow_cluster.kubeconfig_path)
+            # Connectivity check might take a moment if pods are spinning up.
+            # Probe off the event loop, backing off from 0.5s so a fast vcluster is picked up quickly.
+            connected = False
+            for i in range(VCLUSTER_CONNECT_ATTEMPTS):
+                try:
+                    connected = await asyncio.wait_for(
+                        asyncio.to_thread(vcluster_adapter.check_connection),
+                        timeout=VCLUSTER_PROBE_TIMEOUT
+                    )
+                except asyncio.TimeoutError:
+                    connected = False
+                if connected:
                     break
                 log("Waiting for vcluster connectivity...")
-                await asyncio.sleep(2)
+                await asyncio.sleep(min(VCLUSTER_MAX_BACKOFF, 0.5 * 2 ** i))
             
-            if not vcluster_adapter.check_connection():
+            if not connected:
                  raise RuntimeError("Could not connect to VCluster after creation")
             
             log("VCluster Connected.")
@@ -98,13 +118,14 @@ class FixWorkflowService:
             state["status"] = "step_2_analysis"
             log("Step 2: Analyzing resource and generating AI fix...")
             
-            resources = target_adapter.list_resources()
-            target_res = next((r for r in resources if r.unique_id == state["resource_id"]), None)
+            # resource_id is the unique_id, "Kind/namespace/name"; fetch just that object
+            kind, namespace, name = state["resource_id"].split("/", 2)
+            target_res = await asyncio.to_thread(target_adapter.get_resource, kind, name, namespace)
             
             if not target_res:
                 raise ValueError(f"Resource {state['resource_id']} not found in target cluster")
                 
-            remediation = await self.llm_adapter.generate_remediation({
+            remediation = await call_llm_with_retry(self.llm_adapter.generate_remediation, {
                 "resource": target_res.dict(),
                 "issue": state["issue"]
             })
@@ -122,7 +143,7 @@ class FixWorkflowService:
             # This verifies the manifest is valid and runnable, but not necessarily a "Fix" from "Broken".
             # However, for this flow, validating that the new manifest works is the key Test.
             
-            success = vcluster_adapter.apply_manifest(remediation.manifest, target_res.namespace)
+            success = await asyncio.to_thread(vcluster_adapter.apply_manifest, remediation.manifest, target_res.namespace)
             if not success:
                 raise RuntimeError("Failed to apply fix to VCluster")
             
@@ -132,19 +153,29 @@ class FixWorkflowService:
             state["status"] = "step_4_validate_vcluster"
             await asyncio.sleep(5) # Let it settle
             
-            v_resources = vcluster_adapter.list_resources()
+            v_resources = await asyncio.to_thread(vcluster_adapter.list_resources)
             # We assume the resource ID/Name is preserved in the manifest
             v_res = next((r for r in v_resources if r.kind == target_res.kind and r.name == target_res.name), None)
             
             if not v_res:
                  log("Warning: Resource not found in VCluster after apply. Check Namespace?")
             
-            v_analysis = await self.llm_adapter.analyze_context(v_resources, "Check if the specific issue is resolved and ensure no new vulnerabilities are introduced.")
+            v_analysis = await call_llm_with_retry(
+                self.llm_adapter.analyze_context,
+                v_resources, "Check if the specific issue is resolved and ensure no new vulnerabilities are introduced."
+            )
             
             log(f"VCluster Safety Analysis: {v_analysis.summary}")
             
-            # Basic Gate
-            if "high" in v_analysis.summary.lower() or "critical" in v_analysis.summary.lower():
+            # Fail closed: an analysis that errored out validated nothing
+            if v_analysis.failed:
+                log("VCluster validation could not be completed. Aborting real deployment.")
+                raise RuntimeError("VCluster validation failed: the safety analysis did not complete.")
+
+            # Basic Gate: block on the structured issue severities, not the summary
+            # wording ("high availability" is not a risk)
+            max_sev = max((i.severity for i in v_analysis.issues), key=SEVERITY_RANK.get, default=Severity.LOW)
+            if SEVERITY_RANK[max_sev] >= SEVERITY_RANK[Severity.HIGH]:
                  log("VCluster validation flagged potential issues. Aborting real deployment.")
                  raise RuntimeError("VCluster validation failed due to high severity risks detected.")
                  
@@ -154,7 +185,7 @@ class FixWorkflowService:
             state["status"] = "step_5_apply_real"
             log("Step 5: Applying fix to Production/Real Cluster...")
             
-            real_success = target_adapter.apply_manifest(remediation.manifest, target_res.namespace)
+            real_success = await asyncio.to_thread(target_adapter.apply_manifest, remediation.manifest, target_res.namespace)
             if not real_success:
                 raise RuntimeError("Failed to apply to Real Cluster")
                 
@@ -164,17 +195,17 @@ class FixWorkflowService:
             state["status"] = "step_6_final_validate"
             await asyncio.sleep(5)
             
-            final_resources = target_adapter.list_resources()
+            final_resources = await asyncio.to_thread(target_adapter.list_resources)
             final_res = next((r for r in final_resources if r.unique_id == state["resource_id"]), None)
             
-            final_analysis = await self.llm_adapter.analyze_resource(final_res, final_resources)
+            final_analysis = await call_llm_with_retry(self.llm_adapter.analyze_resource, final_res, final_resources)
             state["final_analysis"] = final_analysis.dict()
             
             log("Detailed post-fix analysis complete.")
             log("Process Finished Successfully.")
             state["status"] = "completed"
             if self.on_workflow_complete:
-                self.on_workflow_complete(workflow_id, state)
+                await self.on_workflow_complete(workflow_id, state)
             
         except Exception as e:
             import traceback
@@ -195,7 +226,7 @@ class FixWorkflowService:
                     log(f"Warning during cleanup: {cleanup_err}")
 
             if self.on_workflow_complete:
-                self.on_workflow_complete(workflow_id, state)
+                await self.on_workflow_complete(workflow_id, state)
 
     def get_workflow_status(self, workflow_id: str):
         return workflow_store.get(workflow_id)
@@ -34,4 +34,5 @@ def client(mock_k8s_adapter, mock_llm_adapter):
     # Override global state for testing
     state.active_connections["test-cluster"] = mock_k8s_adapter
     state.llm_adapter = mock_llm_adapter
+    state.resource_cache.clear()
     return TestClient(app)
@@ -21,3 +21,78 @@ def test_analyze_cluster(client):
     assert data["summary"] == "Test Analysis"
     assert len(data["issues"]) == 1
     assert data["issues"][0]["severity"] == "HIGH"
+
+def _zip_bytes(files):
+    import io, zipfile
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zipf:
+        for name, data in files.items():
+            zipf.writestr(name, data)
+    return buf.getvalue()
+
+def test_import_archive_rejects_path_traversal(client):
+    archive = _zip_bytes({"data/../../evil.json": "{}"})
+    response = client.post("/archive/import", files={"file": ("a.zip", archive)})
+    assert response.status_code == 400
+
+def test_import_archive_rejects_oversized_upload(client):
+    archive = _zip_bytes({"data/history.json": "[]"})
+    with patch.object(app.main, "MAX_ARCHIVE_BYTES", 10):
+        response = client.post("/archive/import", files={"file": ("a.zip", archive)})
+    assert response.status_code == 413
+
+def test_import_archive_skips_llm_cache(client, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    archive = _zip_bytes({"data/llm_cache/cache.db": "stale"})
+    response = client.post("/archive/import", files={"file": ("a.zip", archive)})
+    assert response.status_code == 200
+    assert not (tmp_path / "data" / "llm_cache").exists()
+
+def test_settings_reject_zero_llm_concurrency(client):
+    response = client.post("/settings", json={"ai_provider": "ollama", "model_name": "llama3", "llm_concurrency": 0})
+    assert response.status_code == 422
+
+def test_settings_update_closes_previous_llm_adapter(client, mock_llm_adapter, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    response = client.post("/settings", json={"ai_provider": "ollama", "model_name": "llama3"})
+    assert response.status_code == 200
+    mock_llm_adapter.aclose.assert_awaited_once()
+
+def test_analyze_cluster_reports_rate_limit_as_429(client, mock_llm_adapter, monkeypatch):
+    from app.services import llm_guard
+    monkeypatch.setitem(llm_guard.call_llm_with_retry.__kwdefaults__, "base", 0)
+    mock_llm_adapter.analyze_context.side_effect = RuntimeError("Error code: 429 - Rate limit reached")
+    response = client.post("/clusters/test-cluster/analyze")
+    assert response.status_code == 429
+    assert mock_llm_adapter.analyze_context.await_count == 3
+
+def test_analyze_cluster_retries_rate_limited_call(client, mock_llm_adapter, monkeypatch):
+    from app.services import llm_guard
+    monkeypatch.setitem(llm_guard.call_llm_with_retry.__kwdefaults__, "base", 0)
+    result = mock_llm_adapter.analyze_context.return_value
+    mock_llm_adapter.analyze_context.side_effect = [RuntimeError("429 Too Many Requests"), result]
+    response = client.post("/clusters/test-cluster/analyze")
+    assert response.status_code == 200
+    assert response.json()["summary"] == "Test Analysis"
+
+def test_read_json_returns_independent_copies(tmp_path):
+    import asyncio
+    path = str(tmp_path / "settings.json")
+
+    async def main():
+        await app.main._write_json(path, {"ignored_namespaces": ["kube-system"]})
+        first = await app.main._read_json(path, {})
+        first["ignored_namespaces"].append("default")
+        return await app.main._read_json(path, {})
+
+    assert asyncio.run(main()) == {"ignored_namespaces": ["kube-system"]}
+
+def test_settings_update_keeps_state_when_adapter_init_fails(client, mock_llm_adapter, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    before = app.main.state.scan_service.settings
+    with patch.object(app.main, "LangChainAdapter", side_effect=ValueError("bad provider")):
+        response = client.post("/settings", json={"ai_provider": "openai", "model_name": "x"})
+    assert response.status_code == 400
+    assert app.main.state.llm_adapter is mock_llm_adapter
+    assert app.main.state.scan_service.settings is before
+    assert not (tmp_path / "settings.json").exists()
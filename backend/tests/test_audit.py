@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import pytest
+from app.adapters import audit_adapter
+from app.adapters.audit_adapter import CryptoAuditAdapter
+
+def _make_adapter(tmp_path):
+    return CryptoAuditAdapter(
+        log_path=str(tmp_path / "audit_log.jsonl"),
+        private_key_path=str(tmp_path / "private_key.pem")
+    )
+
+def _read_lines(tmp_path):
+    with open(tmp_path / "audit_log.jsonl", "rb") as f:
+        return f.readlines()
+
+def _payload_hash(line):
+    entry = json.loads(line)
+    entry.pop("signature")
+    return hashlib.sha256(json.dumps(entry, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+def test_audit_chain_links_previous_entry(tmp_path):
+    adapter = _make_adapter(tmp_path)
+    adapter.log_action("alice", "APPLY", {"resource": "Deployment/default/web"})
+    adapter.log_action("alice", "DELETE", {"resource": "Pod/default/web-1"})
+    adapter.flush()
+
+    lines = _read_lines(tmp_path)
+    assert json.loads(lines[0])["previous_hash"] == "0" * 64
+    assert json.loads(lines[1])["previous_hash"] == _payload_hash(lines[0])
+
+def test_audit_chain_resumes_after_restart(tmp_path):
+    adapter = _make_adapter(tmp_path)
+    adapter.log_action("alice", "APPLY", {"blob": "x" * 10000})
+    adapter.close()
+
+    restarted = _make_adapter(tmp_path)
+    restarted.log_action("bob", "APPLY", {})
+    restarted.close()
+
+    lines = _read_lines(tmp_path)
+    assert json.loads(lines[1])["previous_hash"] == _payload_hash(lines[0])
+
+def test_audit_entries_are_signed_with_ed25519(tmp_path):
+    adapter = _make_adapter(tmp_path)
+    adapter.log_action("alice", "APPLY", {})
+    adapter.close()
+
+    entry = json.loads(_read_lines(tmp_path)[0])
+    assert len(bytes.fromhex(entry["signature"])) == 64
+
+def test_audit_chain_recovers_from_stale_index(tmp_path):
+    adapter = _make_adapter(tmp_path)
+    adapter.log_action("alice", "APPLY", {})
+    adapter.close()
+
+    # Simulate a crash after the log was written but before the index caught up
+    with open(tmp_path / "audit_log.jsonl", "ab") as f:
+        f.write(b'{"timestamp": "2024-01-01T00:00:00", "user_id": "eve", "action": "APPLY", "details": {}, "previous_hash": "x", "signature": ""}\n')
+
+    restarted = _make_adapter(tmp_path)
+    restarted.log_action("bob", "APPLY", {})
+    restarted.close()
+
+    lines = _read_lines(tmp_path)
+    assert json.loads(lines[2])["previous_hash"] == _payload_hash(lines[1])
+
+def test_audit_failed_write_is_retried_without_corrupting_the_chain(tmp_path, monkeypatch):
+    monkeypatch.setattr(audit_adapter, "WRITE_RETRY_BASE", 0)
+    adapter = _make_adapter(tmp_path)
+    adapter.log_action("alice", "APPLY", {})
+    adapter.flush()
+
+    real_write_all = audit_adapter._write_all
+    def partial_then_fail(fd, data):
+        monkeypatch.setattr(audit_adapter, "_write_all", real_write_all)
+        os.write(fd, data[:10]) # Torn write
+        raise OSError("disk full")
+    monkeypatch.setattr(audit_adapter, "_write_all", partial_then_fail)
+    adapter.log_action("bob", "APPLY", {})
+    adapter.flush()
+    adapter.log_action("carol", "APPLY", {})
+    adapter.close()
+
+    lines = _read_lines(tmp_path)
+    assert [json.loads(l)["user_id"] for l in lines] == ["alice", "bob", "carol"]
+    assert json.loads(lines[1])["previous_hash"] == _payload_hash(lines[0])
+    assert json.loads(lines[2])["previous_hash"] == _payload_hash(lines[1])
+
+def test_audit_refuses_entries_once_writes_fail_for_good(tmp_path, monkeypatch):
+    monkeypatch.setattr(audit_adapter, "WRITE_RETRY_BASE", 0)
+    adapter = _make_adapter(tmp_path)
+    def always_fail(fd, data):
+        raise OSError("disk full")
+    monkeypatch.setattr(audit_adapter, "_write_all", always_fail)
+    adapter.log_action("alice", "APPLY", {})
+
+    with pytest.raises(RuntimeError):
+        adapter.flush()
+    with pytest.raises(RuntimeError):
+        adapter.log_action("bob", "APPLY", {})
+    with pytest.raises(RuntimeError):
+        adapter.close()
+
+def test_audit_refuses_entries_after_close(tmp_path):
+    adapter = _make_adapter(tmp_path)
+    adapter.close()
+    with pytest.raises(RuntimeError):
+        adapter.log_action("alice", "APPLY", {})
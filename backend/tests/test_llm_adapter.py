@@ -0,0 +1,34 @@
+from app.adapters.llm_adapter import _IssueStreamParser
+
+def _feed_all(chunks):
+    parser = _IssueStreamParser()
+    items = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    return parser, items
+
+def test_stream_parser_joins_objects_split_across_chunks():
+    parser, items = _feed_all(['{"summary": "x", "iss', 'ues": [{"title": "a", "sev', 'erity": "HIGH"}, {"title"', ': "b"}]}'])
+    assert items == [{"title": "a", "severity": "HIGH"}, {"title": "b"}]
+    assert parser.complete
+
+def test_stream_parser_yields_each_item_once_complete():
+    parser = _IssueStreamParser()
+    assert parser.feed('{"issues": [{"title": "a"}, {"title": "b"') == [{"title": "a"}]
+    assert parser.feed('}]}') == [{"title": "b"}]
+    assert parser.feed(' trailing text') == []
+
+def test_stream_parser_handles_fenced_and_wrapped_output():
+    parser, items = _feed_all(['```json\n{"result": {"summary": "x", ', '"issues": [{"title": "a"}]}}\n```'])
+    assert items == [{"title": "a"}]
+    assert parser.complete
+
+def test_stream_parser_unclosed_array_is_not_complete():
+    parser, items = _feed_all(['{"issues": [{"title": "a"}, {"title": "b"'])
+    assert items == [{"title": "a"}]
+    assert not parser.complete
+
+def test_stream_parser_skips_non_dict_items():
+    parser, items = _feed_all(['{"issues": [1, "text", null, [2], {"title": "a"}]}'])
+    assert items == [{"title": "a"}]
+    assert parser.complete
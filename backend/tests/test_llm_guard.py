@@ -0,0 +1,73 @@
+import asyncio
+import diskcache
+import pytest
+from types import SimpleNamespace
+from app.adapters import llm_adapter
+from app.services import llm_guard
+from app.services.llm_guard import call_llm_with_retry
+
+def _flaky(errors):
+    calls = []
+    async def fn(value):
+        calls.append(value)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return value
+    return fn, calls
+
+def test_retries_rate_limited_calls():
+    fn, calls = _flaky([RuntimeError("Error code: 429 - Rate limit reached")])
+    assert asyncio.run(call_llm_with_retry(fn, "ok", base=0)) == "ok"
+    assert len(calls) == 2
+
+def test_does_not_retry_other_errors():
+    fn, calls = _flaky([ValueError("failed to generate a valid response")])
+    with pytest.raises(ValueError):
+        asyncio.run(call_llm_with_retry(fn, "ok", base=0))
+    assert len(calls) == 1
+
+def test_gives_up_after_max_attempts():
+    fn, calls = _flaky([RuntimeError("quota exceeded")] * 5)
+    with pytest.raises(RuntimeError):
+        asyncio.run(call_llm_with_retry(fn, "ok", max_attempts=3, base=0))
+    assert len(calls) == 3
+
+def test_shared_slot_caps_concurrency(monkeypatch):
+    monkeypatch.setattr(llm_guard, "LLM_MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(llm_guard, "LLM_MIN_INTERVAL", 0)
+    running, peak = [0], [0]
+
+    async def fn():
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+
+    async def main():
+        await asyncio.gather(*(call_llm_with_retry(fn) for _ in range(6)))
+
+    asyncio.run(main())
+    assert peak[0] == 2
+
+class _FakeChain:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    async def astream(self, inputs):
+        self.calls += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        yield SimpleNamespace(content=response)
+
+def test_adapter_rate_limit_is_retried(monkeypatch, tmp_path):
+    monkeypatch.setattr(llm_adapter, "_response_cache", diskcache.Cache(str(tmp_path)))
+    adapter = llm_adapter.LangChainAdapter(provider="ollama")
+    adapter._context_chain = _FakeChain([
+        RuntimeError("Error code: 429 - Rate limit reached"),
+        '{"summary": "ok", "issues": []}'
+    ])
+    result = asyncio.run(call_llm_with_retry(adapter.analyze_context, [], "check", base=0))
+    assert result.summary == "ok"
+    assert adapter._context_chain.calls == 2
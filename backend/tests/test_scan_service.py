@@ -0,0 +1,108 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import MagicMock
+from app.domain.models import KubernetesResource, AnalysisResult, Issue, Severity, IssueCategory
+from app.services import llm_guard
+from app.services import scan_service as ss
+
+def _pods(namespace, count):
+    return [
+        KubernetesResource(
+            kind="Pod", name=f"p{i}", namespace=namespace, api_version="v1",
+            content={"metadata": {"name": f"p{i}", "namespace": namespace, "resourceVersion": "1"}},
+            unique_id=f"Pod/{namespace}/p{i}"
+        )
+        for i in range(count)
+    ]
+
+class _ChunkLLM:
+    """One issue per call, titled after the first resource; fails for the given namespace."""
+    def __init__(self, fail_namespace=None):
+        self.fail_namespace = fail_namespace
+        self.batches = []
+
+    async def analyze_context(self, resources, query):
+        self.batches.append(len(resources))
+        await asyncio.sleep(0)
+        if resources[0].namespace == self.fail_namespace:
+            raise ValueError("model error")
+        return AnalysisResult(summary="ok", issues=[
+            Issue(severity=Severity.LOW, category=IssueCategory.SECURITY, title=resources[0].unique_id, description="d")
+        ])
+
+@pytest.fixture
+def service_env(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    monkeypatch.setattr(llm_guard, "LLM_MIN_INTERVAL", 0)
+
+def _run_scan(resources, llm, settings):
+    cluster = MagicMock()
+    cluster.list_resources.return_value = resources
+
+    async def main():
+        svc = ss.ScanService({"c": cluster}, llm)
+        svc.settings = settings
+        scan_id = await svc.start_global_scan("c")
+        await ss.scan_store[scan_id]["task"]
+        await svc.flush()
+        svc._flusher_task.cancel()
+        return svc.get_scan_status(scan_id)
+
+    return asyncio.run(main())
+
+def test_scan_splits_large_namespaces_and_merges_every_chunk(service_env):
+    llm = _ChunkLLM()
+    status = _run_scan(_pods("big", 120) + _pods("small", 3), llm, {"scan_chunk_size": 50, "llm_concurrency": 2})
+
+    assert status["status"] == "completed"
+    assert sorted(llm.batches) == [3, 20, 50, 50]
+    assert sorted(i["title"] for i in status["results"]["issues"]) == ["Pod/big/p0", "Pod/big/p100", "Pod/big/p50", "Pod/small/p0"]
+    assert set(status["resource_status"].values()) == {"analyzed"}
+    assert status["analyzed_resources"] == 123
+    assert status["progress"] == 100
+    assert any("big (part 3/3)" in l["message"] for l in status["logs"])
+
+def test_scan_marks_only_the_failed_chunk_as_error(service_env):
+    llm = _ChunkLLM(fail_namespace="bad")
+    status = _run_scan(_pods("bad", 2) + _pods("good", 2), llm, {"scan_chunk_size": 50})
+
+    assert status["status"] == "completed"
+    assert [i["title"] for i in status["results"]["issues"]] == ["Pod/good/p0"]
+    assert status["resource_status"]["Pod/bad/p0"] == "error"
+    assert status["resource_status"]["Pod/good/p1"] == "analyzed"
+
+def test_scan_store_round_trips_through_msgpack(service_env, tmp_path):
+    status = _run_scan(_pods("ns", 2), _ChunkLLM(), {})
+
+    assert (tmp_path / "data" / "scans.mpk").exists()
+    assert not (tmp_path / "data" / "scans.json").exists()
+    assert not list((tmp_path / "data").glob("*.tmp"))
+    reloaded = ss.ScanService({}, _ChunkLLM())
+    scan = ss.scan_store[status["id"]]
+    assert scan["status"] == "completed"
+    assert scan["results"]["issues"] == status["results"]["issues"]
+    assert list(scan["logs"]) == list(status["logs"])
+    assert scan["logs"].maxlen == ss.MAX_SCAN_LOGS
+    assert reloaded.resource_snapshots["c"] == {"Pod/ns/p0": "1", "Pod/ns/p1": "1"}
+
+def test_scan_store_migrates_legacy_json(service_env, tmp_path):
+    legacy_scans = {
+        "old": {"id": "old", "cluster_id": "c", "status": "completed", "logs": [{"timestamp": "10:00:00", "message": "done"}],
+                "results": {"issues": [], "summary": "s", "timestamp": None}},
+        "stuck": {"id": "stuck", "cluster_id": "c", "status": "analyzing", "logs": [], "results": {"issues": []}}
+    }
+    (tmp_path / "data" / "scans.json").write_text(json.dumps(legacy_scans))
+    (tmp_path / "data" / "snapshots.json").write_text(json.dumps({"c": {"Pod/ns/p0": "7"}}))
+
+    svc = ss.ScanService({}, _ChunkLLM())
+    assert ss.scan_store["old"]["results"]["summary"] == "s"
+    assert ss.scan_store["stuck"]["status"] == "failed" # In-flight scans don't survive a restart
+    assert svc.resource_snapshots == {"c": {"Pod/ns/p0": "7"}}
+
+    svc._save_scans() # No running loop: written synchronously
+    assert (tmp_path / "data" / "scans.mpk").exists()
+    assert (tmp_path / "data" / "snapshots.mpk").exists()
+    ss.ScanService({}, _ChunkLLM())
+    assert set(ss.scan_store) == {"old", "stuck"}
@@ -1,5 +1,5 @@
 import { useState, useEffect, useRef } from 'react'
-import { startScan, getScanStatus, startFix, getFixStatus, stopScan } from '../services/api'
+import { startScan, getScanStatus, getScanResources, startFix, getFixStatus, stopScan } from '../services/api'
 import { Play, Loader2, CheckCircle2, AlertTriangle, Shield, Terminal, Wrench, Octagon, FileText, Download } from 'lucide-react'
 import FixModal from './FixModal'
 import ScanOptionsModal from './ScanOptionsModal'
@@ -40,6 +40,8 @@ export default function ScanDashboard({ clusterId, onDisconnect, activeScanId, o
     // Map State
     const [mapResources, setMapResources] = useState<any[]>([])
     const [mapStatus, setMapStatus] = useState<Record<string, 'pending' | 'analyzed' | 'error'>>({})
+    // Scan id and resources_version of the manifests currently in mapResources
+    const mapVersionRef = useRef('')
 
     // UI Confirmation & Alert States
     const [showBatchConfirm, setShowBatchConfirm] = useState(false)
@@ -64,9 +66,14 @@ export default function ScanDashboard({ clusterId, onDisconnect, activeScanId, o
                     setResults(res.results)
                 }
 
-                // Update Map Data
-                if (res.resources_list) setMapResources(res.resources_list)
+                // Update Map Data; manifests are only fetched when the resource list changes
                 if (res.resource_status) setMapStatus(res.resource_status)
+                const mapVersion = `${scanId}:${res.resources_version}`
+                if (res.resources_version && mapVersion !== mapVersionRef.current) {
+                    // Marked as loaded only once it arrived, so a failed fetch is retried next poll
+                    setMapResources(await getScanResources(scanId))
+                    mapVersionRef.current = mapVersion
+                }
 
             } catch (e) {
                 console.error("Polling error:", e)
@@ -79,6 +79,12 @@ export async function getScanStatus(scanId: string) {
     return res.json();
 }
 
+export async function getScanResources(scanId: string) {
+    const res = await fetch(`${API_BASE}/scan/${scanId}/resources`);
+    if (!res.ok) throw new Error('Failed to get scan resources');
+    return res.json();
+}
+
 export async function stopScan(scanId: string) {
     const res = await fetch(`${API_BASE}/scan/${scanId}/stop`, {
         method: 'POST'